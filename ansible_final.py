@@ -1,62 +1,192 @@
-import os, subprocess, json, tempfile, pathlib
+import os, time, subprocess, json, tempfile, pathlib, logging, threading
+import config_archive
+import metrics
+import singleflight
+import router_health
 
 ROUTER_USERNAME = os.getenv("ROUTER_USERNAME", "admin")
 ROUTER_PASSWORD = os.getenv("ROUTER_PASSWORD", "cisco")
 
-PLAYBOOK = "playbook_showrun.yml"  
-INVENTORY = "hosts"              
+PLAYBOOK = "playbook_showrun.yml"
 
-def run_showrun(router_ip: str, student_id: str):
+# "direct" = ดึง config ผ่าน SSH session ที่ pool ไว้ใน process (netmiko_final) แล้วค่อย fallback ไป ansible
+# "ansible" = ใช้ ansible-playbook อย่างเดียว (แบบเดิม)
+SHOWRUN_ENGINE = os.getenv("SHOWRUN_ENGINE", "direct").strip().lower()
+
+def _showrun_filename(student_id: str, router_name: str) -> str:
+    return f"show_run_{student_id}_{router_name}.txt"
+
+def _archive(router_ip: str, res):
+    # ทุก engine (direct / ansible / batch) เก็บผลลง config_archive ที่เดียวกัน
+    ok, filepath, router_name = res
+    if ok:
+        try:
+            config_archive.store_file(router_ip, filepath, router_name or "")
+        except Exception as e:
+            logging.error("archive %s: %s", router_ip, e)
+    return res
+
+def run_showrun(router_ip: str, student_id: str, engine: str = None):
+    """คืน (ok, filepath, router_name) เหมือนกันทุก engine; label protocol ตาม engine ที่ได้ไฟล์จริง"""
+    used, res = _run_showrun(router_ip, student_id, engine)
+    metrics.relabel(protocol=used)
+    return res
+
+@singleflight.coalesce("showrun")
+def _run_showrun(router_ip: str, student_id: str, engine: str = None):
+    # คืน engine คู่กับผล: คนที่รอผลร่วม (singleflight) ต้อง relabel ตาม engine เดียวกัน
+    engine = (engine or SHOWRUN_ENGINE)
+    if engine == "direct":
+        try:
+            res = run_showrun_direct(router_ip, student_id)
+            if res[0]:
+                return "cli", res
+            logging.warning("showrun direct %s returned no config, falling back to ansible", router_ip)
+        except router_health.RouterUnreachable:
+            raise               # ansible ก็ติดต่อไม่ได้เหมือนกัน ไม่ต้องรอ timeout ซ้ำ
+        except Exception as e:
+            logging.warning("showrun direct %s failed (%s), falling back to ansible", router_ip, e)
+    return "ansible", run_showrun_ansible(router_ip, student_id)
+
+def run_showrun_direct(router_ip: str, student_id: str):
+    from netmiko_final import showrun_with_hostname
+    router_name, config = showrun_with_hostname(router_ip)
+    if not router_name or not config:
+        return False, None, None
+    filepath = _showrun_filename(student_id, router_name)
+    pathlib.Path(filepath).write_text(config, encoding="utf-8")
+    return _archive(router_ip, (True, filepath, router_name))
+
+def run_showrun_ansible(router_ip: str, student_id: str):
+    return _SHOWRUN_BATCHER.submit(router_ip, student_id, (False, None, None))
+
+# ---------- batch runs ----------
+# รัน playbook ครั้งเดียวกับหลาย router (forks) จ่ายค่า startup ของ ansible แค่ครั้งเดียว
+# ผลลัพธ์ของแต่ละ host กลับมาทาง temp dir ของ run นั้นๆ (ไม่ใช้ sentinel file ร่วมใน CWD)
+FORKS = int(os.getenv("ANSIBLE_FORKS", "10"))
+MOTD_PLAYBOOK = "playbook_motd.yml"
+
+def _write_inventory(workdir: str, router_ips) -> str:
+    path = os.path.join(workdir, "inventory.ini")
+    lines = ["[target]"] + [f"{ip} router_ip={ip}" for ip in router_ips]
+    pathlib.Path(path).write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+def _run_playbook(playbook: str, router_ips, extra: dict, workdir: str, env_extra: dict = None):
     env = os.environ.copy()
     env["ANSIBLE_HOST_KEY_CHECKING"] = "False"
-
-    extra = {
-        "router_ip": router_ip,
-        "router_username": ROUTER_USERNAME,
-        "router_password": ROUTER_PASSWORD,
-        "student_id": student_id,
-    }
+    env.update(env_extra or {})
+    extra = dict(extra, router_username=ROUTER_USERNAME, router_password=ROUTER_PASSWORD)
     cmd = [
-        "ansible-playbook", "-i", INVENTORY, PLAYBOOK,
+        "ansible-playbook", "-i", _write_inventory(workdir, router_ips), playbook,
+        "-f", str(max(1, min(FORKS, len(router_ips)))),
         "--extra-vars", json.dumps(extra),
     ]
+    return subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=600)
 
-    try:
-        proc = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=600)
-    except Exception as e:
-        return False, None, None
+def _reachable(router_ips):
+    # router ที่ circuit เปิดอยู่ (ทั้งตัว หรือ SSH) ไม่ส่งเข้า playbook (ไม่งั้นรอ SSH timeout ของ ansible)
+    return [ip for ip in router_ips if not (router_health.is_open(ip) or router_health.is_open(ip, 22))]
 
-    if proc.returncode != 0:
-        return False, None, None
+def run_showrun_batch(router_ips, student_id: str):
+    """
+    คืน {router_ip: (ok, filepath, router_name)} สำหรับทุก IP ที่ขอ
+    host ที่ fail จะไม่มีไฟล์ผลลัพธ์ใน result dir -> (False, None, None)
+    """
+    results = {ip: (False, None, None) for ip in router_ips}
+    router_ips = _reachable(results)
+    if not router_ips:
+        return results
+    with tempfile.TemporaryDirectory(prefix="showrun_") as workdir:
+        try:
+            _run_playbook(PLAYBOOK, router_ips,
+                          {"student_id": student_id, "result_dir": workdir}, workdir)
+        except Exception as e:
+            logging.error("showrun batch: %s", e)
+            return results
+        for ip in router_ips:
+            res = pathlib.Path(workdir, f"{ip}.json")
+            if not res.exists():
+                continue
+            data = json.loads(res.read_text(encoding="utf-8"))
+            filepath = data.get("filepath")
+            if filepath and os.path.exists(filepath):
+                results[ip] = _archive(ip, (True, filepath, data.get("router_name")))
+    return results
 
-    sentinel = pathlib.Path(".ansible_showrun_result.json")
-    if not sentinel.exists():
-        return False, None, None
-    data = json.loads(sentinel.read_text(encoding="utf-8"))
-    filepath = data.get("filepath")
-    router_name = data.get("router_name")
-    if not filepath or not os.path.exists(filepath):
-        return False, None, None
-    return True, filepath, router_name
+def _json_stats(stdout: str) -> dict:
+    # stdout callback = json; ข้ามข้อความอื่นที่อาจพิมพ์ก่อนหน้า (เช่น timer callback)
+    start = stdout.find("{")
+    if start < 0:
+        return {}
+    data, _ = json.JSONDecoder().raw_decode(stdout[start:])
+    return data.get("stats", {})
+
+def run_set_motd_batch(router_ips, motd_text: str):
+    """คืน {router_ip: True/False} อ่านผลราย host จาก json callback ของ run นี้"""
+    results = {ip: False for ip in router_ips}
+    router_ips = _reachable(results)
+    if not router_ips:
+        return results
+    with tempfile.TemporaryDirectory(prefix="motd_") as workdir:
+        try:
+            proc = _run_playbook(MOTD_PLAYBOOK, router_ips, {"motd_text": motd_text}, workdir,
+                                 {"ANSIBLE_STDOUT_CALLBACK": "json"})
+            stats = _json_stats(proc.stdout)
+        except Exception as e:
+            logging.error("motd batch: %s", e)
+            return results
+    for ip in router_ips:
+        st = stats.get(ip)
+        results[ip] = bool(st) and not st.get("failures") and not st.get("unreachable")
+        if st and st.get("unreachable"):
+            router_health.record_failure(ip, 22, ConnectionError("ansible: host unreachable"))
+        elif st:
+            router_health.record_success(ip, 22)
+    return results
 
 def run_set_motd(router_ip: str, motd_text: str) -> bool:
     """
     เรียก ansible เพื่อ set MOTD (banner motd)
     คืน True ถ้าสำเร็จ
     """
-    import json, os, subprocess
-    env = os.environ.copy()
-    env["ANSIBLE_HOST_KEY_CHECKING"] = "False"
+    return _MOTD_BATCHER.submit(router_ip, motd_text, False)
+
+# ---------- รวมคำขอเดี่ยวเป็น batch ----------
+# คำขอของหลาย router ที่มาใกล้กัน (เช่น fan-out showrun ที่แตกเป็นงานละ lane) รวมเป็น playbook เดียว
+# คนแรกรอ ANSIBLE_BATCH_WINDOW เก็บ IP ของคนอื่นแล้วรัน; ทุกคนรอผลของตัวเอง
+# lane ของแต่ละ router ถูกถือไว้จนได้ผล (ลำดับคำสั่งต่อ router ไม่เปลี่ยน) และไม่ต้องรอกันครบ
+# (worker ไม่พอ = คนที่มาช้าเริ่ม batch ใหม่เอง ไม่ deadlock)
+BATCH_WINDOW = float(os.getenv("ANSIBLE_BATCH_WINDOW", "0.2"))
+
+class _Batcher:
+    def __init__(self, run_batch, window: float = None):
+        self._run_batch = run_batch           # run_batch(ips, key) -> {ip: ผล}
+        self.window = BATCH_WINDOW if window is None else window
+        self._lock = threading.Lock()
+        self._pending = {}                    # key -> batch ที่ยังรับ IP เพิ่มได้
+
+    def submit(self, router_ip: str, key, default):
+        with self._lock:
+            batch = self._pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._pending[key] = {"ips": [], "done": threading.Event(), "results": {}}
+            batch["ips"].append(router_ip)
+        if not leader:
+            batch["done"].wait()
+            return batch["results"].get(router_ip, default)
+        try:
+            time.sleep(self.window)
+            with self._lock:
+                del self._pending[key]
+            ips = list(dict.fromkeys(batch["ips"]))
+            if len(ips) > 1:
+                logging.info("ansible batch: %d routers in one run", len(ips))
+            batch["results"] = self._run_batch(ips, key)
+        finally:
+            batch["done"].set()
+        return batch["results"].get(router_ip, default)
 
-    extra = {
-        "router_ip": router_ip,
-        "router_username": os.getenv("ROUTER_USERNAME", "admin"),
-        "router_password": os.getenv("ROUTER_PASSWORD", "cisco"),
-        "motd_text": motd_text,
-    }
-    cmd = ["ansible-playbook", "-i", "hosts", "playbook_motd.yml", "--extra-vars", json.dumps(extra)]
-    try:
-        r = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=600)
-        return r.returncode == 0
-    except Exception:
-        return False
+_SHOWRUN_BATCHER = _Batcher(run_showrun_batch)
+_MOTD_BATCHER = _Batcher(run_set_motd_batch)
@@ -0,0 +1,510 @@
+"""
+Local stand-ins สำหรับ benchmark / load test (ไม่ต้องมี CSR จริงหรือ Webex cloud)
+- FakeRouter       : state ของ router หนึ่งตัว (interfaces, motd, hostname) ใช้ร่วมกันทุก protocol
+- FakeRestconf     : HTTPS RESTCONF (ietf-interfaces, Cisco-IOS-XE-native banner motd)
+- FakeNetconf      : SSH subsystem "netconf" (hello, get-config, get, edit-config, commit, close-session)
+- FakeCli          : SSH shell แบบ IOS (show ip interface brief, show banner motd, show running-config)
+- FakeWebex        : Webex messages API (list / get / post)
+ทุกตัวรับ latency (วินาที) ที่หน่วงก่อนตอบแต่ละ request/คำสั่ง
+"""
+import os, re, json, ssl, time, socket, datetime, tempfile, threading, itertools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, parse_qs, unquote
+from xml.sax.saxutils import escape
+
+import paramiko
+from lxml import etree
+
+IETF_IF = "urn:ietf:params:xml:ns:yang:ietf-interfaces"
+NATIVE  = "http://cisco.com/ns/yang/Cisco-IOS-XE-native"
+NC_BASE = "urn:ietf:params:xml:ns:netconf:base:1.0"
+EOM = b"]]>]]>"
+
+# ---------- shared router state ----------
+class FakeRouter:
+    def __init__(self, hostname: str = "R1", gigabit: int = 3, motd: str = "Authorized users only!"):
+        self.hostname = hostname
+        self.motd = motd
+        self.lock = threading.Lock()
+        self.interfaces: Dict[str, dict] = {}
+        for i in range(1, gigabit + 1):
+            self.interfaces[f"GigabitEthernet{i}"] = {
+                "type": "iana-if-type:ethernetCsmacd",
+                "enabled": i != gigabit,
+                "ip": f"10.0.{i}.1" if i == 1 else None, "netmask": "255.255.255.0",
+            }
+
+    def oper(self, name: str) -> str:
+        return "up" if self.interfaces[name]["enabled"] else "down"
+
+    def running_config(self) -> str:
+        lines = ["Building configuration...", "",
+                 "Current configuration : 4242 bytes", "!",
+                 f"! Last configuration change at {time.strftime('%H:%M:%S UTC %a %b %d %Y')} by admin", "!",
+                 "version 16.9", "!", f"hostname {self.hostname}", "!"]
+        with self.lock:
+            for name, i in sorted(self.interfaces.items()):
+                lines.append(f"interface {name}")
+                lines.append(f" ip address {i['ip']} {i['netmask']}" if i["ip"] else " no ip address")
+                if not i["enabled"]:
+                    lines.append(" shutdown")
+                lines.append("!")
+            if self.motd:
+                lines += [f"banner motd ^C", self.motd, "^C", "!"]
+        lines.append("end")
+        return "\n".join(lines)
+
+# ---------- helpers ----------
+class _Server:
+    """ตัวช่วย start/stop สำหรับ ThreadingHTTPServer"""
+    httpd: ThreadingHTTPServer
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def _self_signed_context() -> ssl.SSLContext:
+    from cryptography import x509
+    from cryptography.x509.oid import NameOID
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "fake-router")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name)
+            .public_key(key.public_key()).serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=30))
+            .sign(key, hashes.SHA256()))
+    d = tempfile.mkdtemp(prefix="fake_tls_")
+    cert_p, key_p = os.path.join(d, "cert.pem"), os.path.join(d, "key.pem")
+    with open(cert_p, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_p, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL,
+                                  serialization.NoEncryption()))
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ctx.load_cert_chain(cert_p, key_p)
+    return ctx
+
+# ---------- RESTCONF ----------
+class FakeRestconf(_Server):
+    def __init__(self, router: FakeRouter, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.router, self.latency = router, latency
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _reply(self, code: int, body: Optional[dict] = None):
+                data = json.dumps(body).encode() if body is not None else b""
+                self.send_response(code)
+                self.send_header("Content-Type", "application/yang-data+json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self) -> dict:
+                n = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(n) or b"{}")
+
+            def _route(self, method: str):
+                time.sleep(fake.latency)
+                path = unquote(urlparse(self.path).path)
+                body = self._body() if method in ("POST", "PUT", "PATCH") else {}
+                code, out = fake.handle(method, path, body)
+                self._reply(code, out)
+
+            def do_GET(self):    self._route("GET")
+            def do_POST(self):   self._route("POST")
+            def do_PUT(self):    self._route("PUT")
+            def do_PATCH(self):  self._route("PATCH")
+            def do_DELETE(self): self._route("DELETE")
+            def log_message(self, *a): pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.socket = _self_signed_context().wrap_socket(self.httpd.socket, server_side=True)
+
+    def _if_json(self, name: str) -> dict:
+        i = self.router.interfaces[name]
+        d = {"name": name, "type": i["type"], "enabled": i["enabled"]}
+        if i["ip"]:
+            d["ietf-ip:ipv4"] = {"address": [{"ip": i["ip"], "netmask": i["netmask"]}]}
+        return d
+
+    def handle(self, method: str, path: str, body: dict):
+        r = self.router
+        prefix = "/restconf/data/"
+        if not path.startswith(prefix):
+            return 404, None
+        res = path[len(prefix):]
+        with r.lock:
+            if res == "ietf-interfaces:interfaces" and method == "GET":
+                return 200, {"ietf-interfaces:interfaces": {"interface": [self._if_json(n) for n in r.interfaces]}}
+            if res == "ietf-interfaces:interfaces" and method == "POST":
+                i = body.get("ietf-interfaces:interface", {})
+                if i.get("name") in r.interfaces:
+                    return 409, {"errors": {"error": [{"error-tag": "data-exists"}]}}
+                r.interfaces[i["name"]] = self._from_json(i)
+                return 201, None
+            if res == "ietf-interfaces:interfaces-state" and method == "GET":
+                return 200, {"ietf-interfaces:interfaces-state": {"interface": [
+                    {"name": n, "admin-status": "up" if i["enabled"] else "down", "oper-status": r.oper(n)}
+                    for n, i in r.interfaces.items()]}}
+            if res == "Cisco-IOS-XE-native:native/banner/motd":
+                if method == "GET":
+                    return (200, {"Cisco-IOS-XE-native:motd": {"banner": r.motd}}) if r.motd else (404, None)
+                if method in ("PUT", "PATCH"):
+                    r.motd = body.get("Cisco-IOS-XE-native:motd", {}).get("banner", "")
+                    return 204, None
+                if method == "DELETE":
+                    r.motd = ""
+                    return 204, None
+            m = re.fullmatch(r"ietf-interfaces:interfaces/interface=([^/]+)", res)
+            if not m:
+                return 404, None
+            name = m.group(1)
+            if method == "GET":
+                return (200, {"ietf-interfaces:interface": self._if_json(name)}) if name in r.interfaces else (404, None)
+            if method == "PUT":
+                created = name not in r.interfaces
+                r.interfaces[name] = self._from_json(body.get("ietf-interfaces:interface", {}))
+                return (201 if created else 204), None
+            if name not in r.interfaces:
+                return 404, None
+            if method == "PATCH":
+                i = body.get("ietf-interfaces:interface", {})
+                if "enabled" in i:
+                    r.interfaces[name]["enabled"] = bool(i["enabled"])
+                return 204, None
+            if method == "DELETE":
+                del r.interfaces[name]
+                return 204, None
+        return 405, None
+
+    @staticmethod
+    def _from_json(i: dict) -> dict:
+        addr = (i.get("ietf-ip:ipv4", {}).get("address") or [{}])[0]
+        return {"type": i.get("type", "iana-if-type:softwareLoopback"), "enabled": i.get("enabled", True),
+                "ip": addr.get("ip"), "netmask": addr.get("netmask", "255.255.255.0")}
+
+# ---------- SSH base ----------
+class _SSHAuth(paramiko.ServerInterface):
+    def __init__(self):
+        self.event = threading.Event()
+        self.kind = None
+
+    def get_allowed_auths(self, username): return "password"
+    def check_auth_password(self, username, password): return paramiko.AUTH_SUCCESSFUL
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+    def check_channel_pty_request(self, *a): return True
+    def check_channel_shell_request(self, channel):
+        self.kind = "shell"; self.event.set(); return True
+    def check_channel_subsystem_request(self, channel, name):
+        self.kind = name; self.event.set(); return True
+
+class _SSHServer:
+    host_key = None
+
+    def __init__(self, latency: float, host: str, port: int):
+        self.latency = latency
+        if _SSHServer.host_key is None:
+            _SSHServer.host_key = paramiko.RSAKey.generate(2048)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(50)
+        self._stop = False
+
+    @property
+    def port(self) -> int:
+        return self.sock.getsockname()[1]
+
+    def start(self):
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop = True
+        self.sock.close()
+
+    def _accept_loop(self):
+        while not self._stop:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client):
+        t = paramiko.Transport(client)
+        t.add_server_key(self.host_key)
+        auth = _SSHAuth()
+        try:
+            t.start_server(server=auth)
+            chan = t.accept(20)
+            if chan is None or not auth.event.wait(10):
+                return
+            self.session(chan, auth.kind)
+        except Exception:
+            pass
+        finally:
+            t.close()
+
+    def session(self, chan, kind):
+        raise NotImplementedError
+
+# ---------- NETCONF ----------
+class FakeNetconf(_SSHServer):
+    _ids = itertools.count(1)
+
+    def __init__(self, router: FakeRouter, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        super().__init__(latency, host, port)
+        self.router = router
+
+    def session(self, chan, kind):
+        if kind != "netconf":
+            return
+        hello = (f'<?xml version="1.0" encoding="UTF-8"?><hello xmlns="{NC_BASE}"><capabilities>'
+                 f'<capability>urn:ietf:params:netconf:base:1.0</capability>'
+                 f'<capability>urn:ietf:params:netconf:capability:candidate:1.0</capability>'
+                 f'<capability>urn:ietf:params:netconf:capability:confirmed-commit:1.0</capability>'
+                 f'<capability>{IETF_IF}?module=ietf-interfaces</capability>'
+                 f'</capabilities><session-id>{next(self._ids)}</session-id></hello>')
+        chan.sendall(hello.encode() + EOM)
+        buf = b""
+        got_hello = False
+        candidate = []              # edit-config ที่ค้างใน candidate ของ session นี้
+        while True:
+            data = chan.recv(65536)
+            if not data:
+                return
+            buf += data
+            while EOM in buf:
+                msg, buf = buf.split(EOM, 1)
+                if not got_hello:
+                    got_hello = True
+                    continue
+                reply, close = self.rpc(msg, candidate)
+                time.sleep(self.latency)
+                chan.sendall(reply.encode() + EOM)
+                if close:
+                    return
+
+    def rpc(self, raw: bytes, candidate: list):
+        root = etree.fromstring(raw.strip())
+        mid = root.get("message-id", "")
+        op = root[0]
+        tag = etree.QName(op).localname
+        close = False
+        if tag in ("get-config", "get"):
+            body = f"<data>{self.data_xml(state=(tag == 'get'))}</data>"
+        elif tag == "edit-config" and op.find(f"{{{NC_BASE}}}target/{{{NC_BASE}}}candidate") is not None:
+            candidate.append(op)
+            body = "<ok/>"
+        elif tag == "edit-config":
+            body = self.edit(op)
+        elif tag == "commit":
+            # ไม่จำลอง rollback ของ confirmed-commit: apply ทันที
+            body = "<ok/>"
+            for pending in candidate:
+                body = self.edit(pending)
+                if body != "<ok/>":
+                    break
+            candidate.clear()
+        elif tag == "discard-changes":
+            candidate.clear()
+            body = "<ok/>"
+        elif tag == "close-session":
+            body, close = "<ok/>", True
+        else:
+            body = "<ok/>"
+        return f'<rpc-reply xmlns="{NC_BASE}" message-id="{mid}">{body}</rpc-reply>', close
+
+    def data_xml(self, state: bool = False) -> str:
+        r = self.router
+        with r.lock:
+            cfg = "".join(
+                f"<interface><name>{n}</name><type xmlns:ianaift=\"urn:ietf:params:xml:ns:yang:iana-if-type\">"
+                f"ianaift:{i['type'].split(':')[-1]}</type><enabled>{str(i['enabled']).lower()}</enabled></interface>"
+                for n, i in r.interfaces.items())
+            out = f'<interfaces xmlns="{IETF_IF}">{cfg}</interfaces>'
+            if r.motd:
+                out += f'<native xmlns="{NATIVE}"><banner><motd><banner>{escape(r.motd)}</banner></motd></banner></native>'
+            if state:
+                st = "".join(
+                    f"<interface><name>{n}</name><admin-status>{'up' if i['enabled'] else 'down'}</admin-status>"
+                    f"<oper-status>{r.oper(n)}</oper-status></interface>"
+                    for n, i in r.interfaces.items())
+                out += f'<interfaces-state xmlns="{IETF_IF}">{st}</interfaces-state>'
+        return out
+
+    def edit(self, op) -> str:
+        r = self.router
+        ns = {"if": IETF_IF}
+        with r.lock:
+            for motd in op.xpath(".//n:native/n:banner/n:motd", namespaces={"n": NATIVE}):
+                r.motd = motd.findtext(f"{{{NATIVE}}}banner") or ""
+            for itf in op.xpath(".//if:interfaces/if:interface", namespaces=ns):
+                name = itf.findtext(f"{{{IETF_IF}}}name")
+                operation = itf.get("operation") or itf.get(f"{{{NC_BASE}}}operation")
+                if operation == "delete":
+                    if name not in r.interfaces:
+                        return ("<rpc-error><error-type>application</error-type>"
+                                "<error-tag>data-missing</error-tag><error-severity>error</error-severity></rpc-error>")
+                    del r.interfaces[name]
+                    continue
+                cur = r.interfaces.setdefault(name, {"type": "iana-if-type:softwareLoopback", "enabled": True,
+                                                     "ip": None, "netmask": "255.255.255.0"})
+                en = itf.findtext(f"{{{IETF_IF}}}enabled")
+                if en is not None:
+                    cur["enabled"] = en == "true"
+                ip = itf.findtext(".//{urn:ietf:params:xml:ns:yang:ietf-ip}ip")
+                if ip:
+                    cur["ip"] = ip
+        return "<ok/>"
+
+# ---------- IOS CLI ----------
+class FakeCli(_SSHServer):
+    def __init__(self, router: FakeRouter, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        super().__init__(latency, host, port)
+        self.router = router
+
+    def command(self, cmd: str) -> str:
+        r = self.router
+        if not cmd or cmd.startswith("terminal"):
+            return ""
+        if cmd.startswith("show ip interface brief"):
+            rows = ["Interface              IP-Address      OK? Method Status                Protocol"]
+            with r.lock:
+                for n, i in sorted(r.interfaces.items()):
+                    st = "up" if i["enabled"] else "administratively down"
+                    rows.append(f"{n:<22} {(i['ip'] or 'unassigned'):<15} YES manual {st:<21} {r.oper(n)}")
+            if "| include" in cmd:
+                pat = cmd.split("| include", 1)[1].strip()
+                rows = [l for l in rows if re.search(pat, l)]
+            return "\n".join(rows)
+        if cmd == "show banner motd":
+            return r.motd or ""
+        if cmd.startswith("show running-config"):
+            cfg = r.running_config()
+            if "section banner motd" in cmd:
+                return f"banner motd ^C\n{r.motd}\n^C" if r.motd else ""
+            return cfg
+        return f"% Invalid input detected at '^' marker."
+
+    def session(self, chan, kind):
+        if kind != "shell":
+            return
+        prompt = f"{self.router.hostname}#"
+        chan.sendall(f"\r\n{prompt}".encode())
+        buf = ""
+        while True:
+            data = chan.recv(4096)
+            if not data:
+                return
+            buf += data.decode(errors="ignore").replace("\x00", "")      # is_alive() ส่ง NUL; IOS ไม่สนใจ
+            while "\n" in buf or "\r" in buf:
+                line, _, buf = buf.replace("\r\n", "\n").replace("\r", "\n").partition("\n")
+                cmd = line.strip()
+                if cmd in ("exit", "quit"):
+                    return
+                out = self.command(cmd)
+                if cmd:
+                    time.sleep(self.latency)
+                text = f"{cmd}\r\n" + (out.replace("\n", "\r\n") + "\r\n" if out else "") + prompt
+                chan.sendall(text.encode())
+
+# ---------- Webex ----------
+class FakeWebex(_Server):
+    """/v1/messages: GET (list, ใหม่สุดก่อน), GET /{id}, POST (json หรือ multipart)"""
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0, rate_limit_every: int = 0):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.messages: List[dict] = []
+        self.lock = threading.Lock()
+        self._n = itertools.count(1)
+        self._posts = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _reply(self, code, body=None, headers=None):
+                data = json.dumps(body).encode() if body is not None else b""
+                self.send_response(code)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                time.sleep(fake.latency)
+                u = urlparse(self.path)
+                if u.path.rstrip("/") == "/v1/messages":
+                    q = parse_qs(u.query)
+                    n = int(q.get("max", ["50"])[0])
+                    with fake.lock:
+                        items = list(reversed(fake.messages))[:n]
+                    return self._reply(200, {"items": items})
+                m = re.fullmatch(r"/v1/messages/([^/]+)", u.path)
+                if m:
+                    with fake.lock:
+                        found = [x for x in fake.messages if x["id"] == m.group(1)]
+                    return self._reply(200, found[0]) if found else self._reply(404, {})
+                self._reply(404, {})
+
+            def do_POST(self):
+                time.sleep(fake.latency)
+                n = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(n)
+                with fake.lock:
+                    fake._posts += 1
+                    limited = fake.rate_limit_every and fake._posts % fake.rate_limit_every == 0
+                if limited:
+                    return self._reply(429, {}, {"Retry-After": "1"})
+                ctype = self.headers.get("Content-Type", "")
+                if ctype.startswith("application/json"):
+                    body = json.loads(raw or b"{}")
+                    msg = fake.post(body.get("text", ""), room_id=body.get("roomId", ""), person="bot")
+                else:
+                    msg = fake.post("", room_id="", person="bot", files=[len(raw)])
+                self._reply(200, msg)
+
+            def log_message(self, *a): pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def post(self, text: str, room_id: str = "room", person: str = "user", files=None) -> dict:
+        """เพิ่มข้อความเข้าห้อง (ใช้จำลองผู้ใช้พิมพ์คำสั่ง หรือรับข้อความจาก bot)"""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        msg = {"id": f"M{next(self._n):08d}", "roomId": room_id, "personEmail": person, "text": text,
+               "created": now.isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+               "_t": time.monotonic()}
+        if files:
+            msg["files"] = files
+        with self.lock:
+            self.messages.append(msg)
+        return msg
+
+    def bot_messages(self) -> List[dict]:
+        with self.lock:
+            return [m for m in self.messages if m["personEmail"] == "bot"]
@@ -0,0 +1,180 @@
+"""
+Load replay: ป้อนข้อความแบบ Webex จากไฟล์ JSONL เข้า dispatch() ของบอท (เส้นทางเดียวกับของจริง)
+โดยชี้ไปที่ fake routers + fake Webex ในเครื่อง แล้วรายงาน throughput, queueing delay
+และ reply latency แยกตามชนิดคำสั่ง
+
+    python bench/replay.py bench/sample_messages.jsonl --rate 20 --repeat 5
+    python bench/replay.py recorded.jsonl --recorded --speed 2
+
+แต่ละบรรทัด: {"text": "/66070273 10.0.15.61 status", "t": 0.35}
+("t" = วินาทีนับจากข้อความแรก ใช้กับ --recorded; ถ้าไม่มีใช้ --rate)
+router 10.0.15.61-65 ถูกแทนด้วย fake ที่ 127.0.15.61-65
+"""
+import os, sys, json, time, argparse, tempfile, threading
+from collections import defaultdict
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeRouter, FakeRestconf, FakeNetconf, FakeCli, FakeWebex
+from run_bench import percentile
+
+LAB_IPS = [f"10.0.15.{i}" for i in range(61, 66)]
+FAKE_IP = lambda ip: ip.replace("10.0.15.", "127.0.15.", 1)
+
+def load_messages(path: str) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(l) for l in f if l.strip()]
+
+def start_lab(n_routers: int, latency: float) -> Dict[str, dict]:
+    """fake ต่อ router บน 127.0.15.x พอร์ตเดียวกันทุกตัว (driver ใช้ PORT ระดับ module)"""
+    lab, ports = {}, {}
+    for i, ip in enumerate(LAB_IPS[:n_routers]):
+        host = FAKE_IP(ip)
+        router = FakeRouter(hostname=f"IPA-Router{i + 1}")
+        fakes = {
+            "restconf": FakeRestconf(router, latency, host, ports.get("restconf", 0)).start(),
+            "netconf": FakeNetconf(router, latency, host, ports.get("netconf", 0)).start(),
+            "cli": FakeCli(router, latency, host, ports.get("cli", 0)).start(),
+        }
+        ports = {k: f.port for k, f in fakes.items()}
+        lab[host] = {"router": router, **fakes}
+    return lab
+
+def command_type(p: dict) -> str:
+    if p.get("method_select"):
+        return "method"
+    return p.get("command") or "invalid"
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("messages")
+    ap.add_argument("--rate", type=float, default=10.0, help="ข้อความ/วินาที (ถ้าไม่ใช้ --recorded)")
+    ap.add_argument("--recorded", action="store_true", help="ใช้จังหวะเวลา 't' ในไฟล์")
+    ap.add_argument("--speed", type=float, default=1.0, help="เร่งจังหวะ --recorded")
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--routers", type=int, default=5)
+    ap.add_argument("--latency", type=float, default=0.01, help="หน่วงต่อ request ของ fake device")
+    ap.add_argument("--webex-latency", type=float, default=0.05)
+    ap.add_argument("--workers", type=int, default=5)
+    ap.add_argument("--sid", default="66070273")
+    ap.add_argument("--poll", type=float, default=0.0, help="เปิด state poller ทุกกี่วินาที (0 = ปิด)")
+    ap.add_argument("--json", help="เขียนผลเป็น JSON")
+    args = ap.parse_args(argv)
+    args.messages = os.path.abspath(args.messages)
+    args.json = os.path.abspath(args.json) if args.json else None
+
+    webex = FakeWebex(args.webex_latency).start()
+    lab = start_lab(args.routers, args.latency)
+    workdir = tempfile.mkdtemp(prefix="replay_")
+    os.environ.update({
+        "WEBEX_BOT_TOKEN": "replay", "WEBEX_ROOM_ID": "room", "STUDENT_ID": args.sid,
+        "WEBEX_API_BASE": webex.base, "BOT_WORKERS": str(args.workers),
+        "DEDUPE_PATH": os.path.join(workdir, "seen.log"),
+        "CONFIG_ARCHIVE_DIR": os.path.join(workdir, "archive"),
+        "SHOWRUN_ENGINE": "direct",
+    })
+    os.chdir(workdir)          # showrun เขียนไฟล์ลง CWD
+
+    import ipa2024_final as bot
+    import restconf_final, netconf_final, netmiko_final
+    any_lab = next(iter(lab.values()))
+    restconf_final.PORT = str(any_lab["restconf"].port)
+    netconf_final.PORT = any_lab["netconf"].port
+    netmiko_final.PORT = any_lab["cli"].port
+    bot.ALLOWED_IPS = set(lab)
+    if args.poll > 0:
+        bot.state_poller.MAX_AGE = 2 * args.poll
+        bot.state_poller.start(sorted(lab), track=[f"Loopback{args.sid}"], interval=args.poll)
+        time.sleep(0.5)        # รอ poll รอบแรก
+
+    # ---------- correlation ----------
+    # ผู้ส่งเป็นคิว FIFO ห้องเดียว: reply ลำดับที่ k ที่ fake Webex ได้รับ = enqueue ลำดับที่ k
+    local = threading.local()
+    order_lock = threading.Lock()
+    enqueued: List[int] = []
+    orig_text, orig_file = bot.SENDER.send_text, bot.SENDER.send_file
+    def send_text(room, text):
+        with order_lock:
+            orig_text(room, text); enqueued.append(getattr(local, "req", -1))
+    def send_file(room, path, caption=""):
+        with order_lock:
+            orig_file(room, path, caption); enqueued.append(getattr(local, "req", -1))
+    bot.SENDER.send_text, bot.SENDER.send_file = send_text, send_file
+
+    reqs: List[dict] = []
+    def timed(req: dict):
+        # ครอบทุกงานของข้อความนี้ (fan-out มีหลายงาน): start = งานแรกเริ่ม, end = งานสุดท้ายจบ
+        def wrap(fn):
+            def job(*args, **kwargs):
+                local.req = req["i"]
+                req.setdefault("start", time.monotonic())
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    req["end"] = time.monotonic()
+                    local.req = -1
+            return job
+        return wrap
+
+    from dispatcher import RouterDispatcher
+    dispatcher = RouterDispatcher(args.workers)
+
+    base = load_messages(args.messages)
+    span = max((float(m.get("t", 0)) for m in base), default=0.0) + 1.0 / args.rate
+    msgs = base * args.repeat
+    t0 = time.monotonic()
+    for i, m in enumerate(msgs):
+        text = m["text"]
+        text = text.replace("10.0.15.", "127.0.15.")
+        if args.recorded and "t" in m:
+            due = t0 + (float(m["t"]) + (i // len(base)) * span) / args.speed
+        else:
+            due = t0 + i / args.rate
+        time.sleep(max(0.0, due - time.monotonic()))
+        p = bot.parse_text(text)
+        req = {"i": i, "type": command_type(p), "submit": time.monotonic()}
+        reqs.append(req)
+        bot.dispatch(dispatcher, text, wrap=timed(req))
+
+    while dispatcher.stats()["in_flight"]:
+        time.sleep(0.01)
+    bot.SENDER.flush(120)
+    wall = time.monotonic() - t0
+
+    replies = webex.bot_messages()
+    for k, rid in enumerate(enqueued):
+        if 0 <= rid < len(reqs) and k < len(replies) and "reply" not in reqs[rid]:
+            reqs[rid]["reply"] = replies[k]["_t"]
+
+    # ---------- report ----------
+    by_type = defaultdict(list)
+    for r in reqs:
+        by_type[r["type"]].append(r)
+    rows = []
+    for t, rs in sorted(by_type.items()):
+        q = [r["start"] - r["submit"] for r in rs if "start" in r]
+        lat = [r["reply"] - r["submit"] for r in rs if "reply" in r]
+        rows.append({"command": t, "n": len(rs), "replied": len(lat),
+                     "queue_p50": percentile(q, 50), "queue_p95": percentile(q, 95),
+                     "reply_p50": percentile(lat, 50), "reply_p95": percentile(lat, 95),
+                     "reply_p99": percentile(lat, 99)})
+    summary = {"messages": len(reqs), "wall_s": wall, "throughput": len(reqs) / wall if wall else 0.0,
+               "replies": len(replies), "sender": bot.SENDER.stats(), "commands": rows}
+
+    print(f"{len(reqs)} messages in {wall:.2f}s -> {summary['throughput']:.1f} msg/s, "
+          f"{len(replies)} replies, routers={args.routers} workers={args.workers}")
+    print(f"{'command':16} {'n':>5} {'replied':>7} {'queue p50':>10} {'queue p95':>10} "
+          f"{'reply p50':>10} {'reply p95':>10} {'reply p99':>10}   (ms)")
+    for r in rows:
+        print(f"{r['command']:16} {r['n']:>5} {r['replied']:>7} {r['queue_p50']*1e3:>10.1f} "
+              f"{r['queue_p95']*1e3:>10.1f} {r['reply_p50']*1e3:>10.1f} {r['reply_p95']*1e3:>10.1f} "
+              f"{r['reply_p99']*1e3:>10.1f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return summary
+
+if __name__ == "__main__":
+    main()
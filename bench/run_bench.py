@@ -0,0 +1,153 @@
+"""
+Offline benchmark: วัด latency (p50/p95/p99) และ throughput ของแต่ละ driver กับ fakes ในเครื่อง
+
+    python bench/run_bench.py --iterations 50 --latency 0.005 --protocols restconf,netconf,cli,webex
+"""
+import os, sys, time, argparse, statistics
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeRouter, FakeRestconf, FakeNetconf, FakeCli, FakeWebex
+
+SID = "66070273"
+HOST = "127.0.0.1"
+
+def percentile(xs: List[float], p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))] if xs else 0.0
+
+def measure(name: str, fn: Callable[[], object], n: int, concurrency: int = 1) -> Dict[str, float]:
+    lat: List[float] = []
+    def one(_):
+        t = time.perf_counter()
+        fn()
+        lat.append(time.perf_counter() - t)
+    t0 = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as ex:
+            list(ex.map(one, range(n)))
+    else:
+        for i in range(n):
+            one(i)
+    wall = time.perf_counter() - t0
+    return {"op": name, "n": n, "p50": percentile(lat, 50), "p95": percentile(lat, 95),
+            "p99": percentile(lat, 99), "mean": statistics.mean(lat) if lat else 0.0,
+            "ops_s": n / wall if wall else 0.0}
+
+def start_fakes(latency: float):
+    router = FakeRouter()
+    return router, {
+        "restconf": FakeRestconf(router, latency).start(),
+        "netconf": FakeNetconf(router, latency).start(),
+        "cli": FakeCli(router, latency).start(),
+        "webex": FakeWebex(latency).start(),
+    }
+
+def configure(fakes) -> None:
+    """ชี้ driver modules ไปที่ fakes (ต้องเรียกก่อนใช้งาน driver)"""
+    import restconf_final, netconf_final, netmiko_final
+    restconf_final.PORT = str(fakes["restconf"].port)
+    netconf_final.PORT = fakes["netconf"].port
+    netmiko_final.PORT = fakes["cli"].port
+
+@contextmanager
+def device_reads():
+    """ปิด status_cache ชั่วคราว: แถว status ต้องวัดรอบไปกลับถึง device ไม่ใช่ cache hit"""
+    import status_cache
+    ttl, status_cache.STATUS_CACHE_TTL = status_cache.STATUS_CACHE_TTL, 0
+    try:
+        yield
+    finally:
+        status_cache.STATUS_CACHE_TTL = ttl
+
+def bench_status(proto: str, status: Callable, n: int, conc: int):
+    with device_reads():
+        out = [measure(f"{proto}.status", lambda: status(HOST, SID), n),
+               measure(f"{proto}.status(concurrent)", lambda: status(HOST, SID), n, conc)]
+    status(HOST, SID)           # เติม cache ให้แถว cache hit
+    out.append(measure(f"{proto}.status(cache hit)", lambda: status(HOST, SID), n))
+    return out
+
+def bench_restconf(n: int, conc: int):
+    import restconf_final as r
+    out = [measure("restconf.create", lambda: r.create(HOST, SID), n)]
+    out += bench_status("restconf", r.status, n, conc)
+    cycle = [r.disable, r.enable, r.delete]
+    out += [measure(f"restconf.{f.__name__}", lambda f=f: f(HOST, SID), n) for f in cycle]
+    out.append(measure("restconf.gigabit_status", lambda: r.gigabit_status(HOST), n))
+    out.append(measure("restconf.get_motd", lambda: r.get_motd(HOST), n))
+    out.append(measure("restconf.set_motd", lambda: r.set_motd(HOST, "bench"), n))
+    return out
+
+def bench_netconf(n: int, conc: int):
+    import netconf_final as nc
+    out = [measure("netconf.create", lambda: nc.create(HOST, SID), n)]
+    out += bench_status("netconf", nc.status, n, conc)
+    cycle = [nc.disable, nc.enable, nc.delete]
+    out += [measure(f"netconf.{f.__name__}", lambda f=f: f(HOST, SID), n) for f in cycle]
+    out.append(measure("netconf.gigabit_status", lambda: nc.gigabit_status(HOST), n))
+    out.append(measure("netconf.get_motd", lambda: nc.get_motd(HOST), n))
+    out.append(measure("netconf.set_motd", lambda: nc.set_motd(HOST, "bench"), n))
+    # provisioning ทั้ง lab: 10 loopback ต่อ edit-config เดียว
+    sids = [str(int(SID) + 1 + i) for i in range(10)]
+    for action in ("create", "disable", "enable", "delete"):
+        out.append(measure(f"netconf.bulk({action} x{len(sids)})",
+                           lambda a=action: nc.bulk(HOST, [(s, a) for s in sids]), max(1, n // 5)))
+    return out
+
+def bench_cli(n: int, conc: int):
+    import netmiko_final as cli
+    return [measure("cli.gigabit_status", lambda: cli.gigabit_status(HOST), n),
+            measure("cli.get_motd", lambda: cli.get_motd(HOST), n),
+            measure("cli.showrun", lambda: cli.showrun(HOST), max(1, n // 5))]
+
+def bench_webex(n: int, conc: int, fake: FakeWebex):
+    import requests
+    from webex_sender import WebexSender
+    http = requests.Session()
+    for i in range(5):
+        fake.post(f"/{SID} {HOST} status")
+    sender = WebexSender(fake.base, "token")
+    def send_and_wait():
+        sender.send_text("room", "bench")
+        sender.flush(30)
+    return [measure("webex.list_messages", lambda: http.get(f"{fake.base}/messages",
+                                                            params={"max": 50}, timeout=20).json(), n),
+            measure("webex.send(queued+delivered)", send_and_wait, n),
+            measure("webex.enqueue", lambda: sender.send_text("room", "bench"), n)]
+
+def report(rows) -> None:
+    print(f"{'operation':34} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9}")
+    for r in rows:
+        print(f"{r['op']:34} {r['n']:>5} {r['p50']*1e3:>9.2f} {r['p95']*1e3:>9.2f} "
+              f"{r['p99']*1e3:>9.2f} {r['ops_s']:>9.1f}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--iterations", "-n", type=int, default=30)
+    ap.add_argument("--latency", type=float, default=0.0, help="หน่วงต่อ request ของ fake (วินาที)")
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--protocols", default="restconf,netconf,cli,webex")
+    args = ap.parse_args(argv)
+
+    router, fakes = start_fakes(args.latency)
+    configure(fakes)
+    rows = []
+    for proto in [p.strip() for p in args.protocols.split(",") if p.strip()]:
+        if proto == "restconf":
+            rows += bench_restconf(args.iterations, args.concurrency)
+        elif proto == "netconf":
+            rows += bench_netconf(args.iterations, args.concurrency)
+        elif proto == "cli":
+            rows += bench_cli(args.iterations, args.concurrency)
+        elif proto == "webex":
+            rows += bench_webex(args.iterations, args.concurrency, fakes["webex"])
+    report(rows)
+    return rows
+
+if __name__ == "__main__":
+    main()
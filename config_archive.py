@@ -0,0 +1,108 @@
+import os, gzip, time, bisect, hashlib, pathlib, threading
+from typing import Dict, List, NamedTuple, Optional
+
+ARCHIVE_DIR = os.getenv("CONFIG_ARCHIVE_DIR", ".config_archive")
+
+class Capture(NamedTuple):
+    ts: float          # epoch seconds
+    sha: str           # sha256 ของ config (ชื่อ object)
+    hostname: str
+
+# ---------- layout ----------
+# <ARCHIVE_DIR>/objects/<sha[:2]>/<sha[2:]>.gz   config แต่ละแบบเก็บครั้งเดียว (gzip)
+# <ARCHIVE_DIR>/index/<router_ip>.tsv             "<ts>\t<sha>\t<hostname>" เรียงตามเวลา (append)
+_LOCK = threading.Lock()
+_INDEX: Dict[str, tuple] = {}       # router_ip -> ((size, mtime), [Capture...], [ts...])
+
+def _object_path(sha: str) -> pathlib.Path:
+    return pathlib.Path(ARCHIVE_DIR, "objects", sha[:2], sha[2:] + ".gz")
+
+def _index_path(router_ip: str) -> pathlib.Path:
+    return pathlib.Path(ARCHIVE_DIR, "index", f"{router_ip}.tsv")
+
+def _version(p: pathlib.Path) -> Optional[tuple]:
+    # mtime อย่างเดียวหยาบเกินไป: append สองครั้งใน tick เดียวกันได้ mtime เท่าเดิม
+    try:
+        st = p.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+def _captures(router_ip: str):
+    """index ของ router นี้ (cache ไว้ในหน่วยความจำ อ่านใหม่เมื่อไฟล์เปลี่ยน)"""
+    p = _index_path(router_ip)
+    ver = _version(p)
+    if ver is None:
+        return [], []
+    cached = _INDEX.get(router_ip)
+    if cached and cached[0] == ver:
+        return cached[1], cached[2]
+    caps = []
+    for line in p.read_text(encoding="utf-8").splitlines():
+        ts, sha, host = (line.split("\t") + ["", ""])[:3]
+        if sha:
+            caps.append(Capture(float(ts), sha, host))
+    caps.sort(key=lambda c: c.ts)
+    keys = [c.ts for c in caps]
+    _INDEX[router_ip] = (ver, caps, keys)
+    return caps, keys
+
+# ---------- write ----------
+def store(router_ip: str, text: str, hostname: str = "", ts: float = None) -> str:
+    """เก็บ config หนึ่งครั้ง คืน sha; ถ้าเนื้อหาเคยเก็บแล้วจะเพิ่มแค่บรรทัดใน index"""
+    data = text.encode("utf-8")
+    sha = hashlib.sha256(data).hexdigest()
+    ts = time.time() if ts is None else ts
+    with _LOCK:
+        obj = _object_path(sha)
+        if not obj.exists():
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            tmp = obj.with_suffix(f".{os.getpid()}.tmp")
+            with gzip.open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, obj)
+        idx = _index_path(router_ip)
+        idx.parent.mkdir(parents=True, exist_ok=True)
+        before = _version(idx)
+        with open(idx, "a", encoding="utf-8") as f:
+            f.write(f"{ts:.3f}\t{sha}\t{hostname}\n")
+        # cache ตรงกับไฟล์ก่อน append: เติม capture ใหม่ลง cache เลย ไม่ต้องอ่าน index ทั้งไฟล์ใหม่
+        cached = _INDEX.get(router_ip)
+        if cached and cached[0] == before:
+            cap = Capture(float(f"{ts:.3f}"), sha, hostname)
+            caps, keys = list(cached[1]), list(cached[2])
+            i = bisect.bisect_right(keys, cap.ts)
+            caps.insert(i, cap); keys.insert(i, cap.ts)
+            _INDEX[router_ip] = (_version(idx), caps, keys)
+        else:
+            _INDEX.pop(router_ip, None)
+    return sha
+
+def store_file(router_ip: str, filepath: str, hostname: str = "") -> str:
+    return store(router_ip, pathlib.Path(filepath).read_text(encoding="utf-8"), hostname)
+
+# ---------- read ----------
+def load(sha: str) -> str:
+    with gzip.open(_object_path(sha), "rb") as f:
+        return f.read().decode("utf-8")
+
+def recent(router_ip: str, n: int = 1) -> List[Capture]:
+    """n capture ล่าสุด ใหม่สุดก่อน"""
+    with _LOCK:
+        return list(reversed(_captures(router_ip)[0][-n:]))
+
+def latest(router_ip: str) -> Optional[Capture]:
+    caps = recent(router_ip, 1)
+    return caps[0] if caps else None
+
+def at(router_ip: str, t: float) -> Optional[Capture]:
+    """capture ล่าสุดที่ ts <= t"""
+    with _LOCK:
+        caps, keys = _captures(router_ip)
+        i = bisect.bisect_right(keys, t)
+    return caps[i - 1] if i else None
+
+def between(router_ip: str, t1: float, t2: float) -> List[Capture]:
+    with _LOCK:
+        caps, keys = _captures(router_ip)
+        return caps[bisect.bisect_left(keys, t1):bisect.bisect_right(keys, t2)]
@@ -0,0 +1,22 @@
+import re, difflib
+from typing import List
+
+# บรรทัดที่เปลี่ยนทุกครั้งที่ดึง config แม้ config จริงไม่เปลี่ยน
+VOLATILE = [
+    re.compile(r"^Building configuration\.\.\."),
+    re.compile(r"^Current configuration\s*:\s*\d+ bytes"),
+    re.compile(r"^! Last configuration change at "),
+    re.compile(r"^! NVRAM config last updated at "),
+    re.compile(r"^! No configuration change since last restart"),
+    re.compile(r"^ntp clock-period "),
+]
+
+def normalize(text: str) -> List[str]:
+    return [l.rstrip() for l in (text or "").splitlines()
+            if not any(p.match(l) for p in VOLATILE)]
+
+def diff_configs(old: str, new: str, name: str = "running-config", context: int = 3) -> str:
+    """unified diff ระหว่าง config เก่า/ใหม่ (ไม่รวมบรรทัด volatile); ไม่มีความต่างคืน ''"""
+    return "\n".join(difflib.unified_diff(normalize(old), normalize(new),
+                                          fromfile=f"{name} (previous)", tofile=f"{name} (current)",
+                                          n=context, lineterm=""))
@@ -0,0 +1,74 @@
+import os, threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+
+DEDUPE_PATH = os.getenv("DEDUPE_PATH", ".seen_ids.log")
+DEDUPE_MAX  = int(os.getenv("DEDUPE_MAX", "5000"))
+
+def _now_iso() -> str:
+    # รูปแบบเดียวกับ "created" ของ Webex จึงเทียบเป็น string ได้
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+class DedupeStore:
+    """
+    เก็บ key ของข้อความที่ประมวลผลแล้ว แบบจำกัดจำนวน (LRU, DEDUPE_MAX)
+    บันทึกลงไฟล์แบบ append ทีละบรรทัด "<created>\\t<key>" และ compact เมื่อไฟล์ยาวเกิน 2 เท่า
+    high-water mark = created ล่าสุดที่เคยประมวลผล (ตอนเริ่ม process)
+    ข้อความที่เก่ากว่านี้ถือว่าเคยเห็นแล้วโดยไม่ต้องค้นใน LRU -> ไม่ replay คำสั่งเก่าหลัง restart
+    """
+    def __init__(self, path: str = DEDUPE_PATH, max_entries: int = DEDUPE_MAX):
+        self.path = path
+        self.max_entries = max_entries
+        self._keys: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._lines = 0
+        self._load()
+        # ไฟล์ยังไม่มี (รันครั้งแรก): ไม่ย้อนไปรันประวัติในห้อง
+        self.high_water: Optional[str] = max(self._keys.values(), default=None) or _now_iso()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                created, _, key = line.rstrip("\n").partition("\t")
+                if not key:
+                    continue
+                self._keys[key] = created
+                self._keys.move_to_end(key)
+                self._lines += 1
+        while len(self._keys) > self.max_entries:
+            self._keys.popitem(last=False)
+
+    def _compact(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(f"{c}\t{k}\n" for k, c in self._keys.items())
+        os.replace(tmp, self.path)
+        self._lines = len(self._keys)
+
+    def seen_or_add(self, key: str, created: str = "") -> bool:
+        """คืน True ถ้าเคยเห็นแล้ว, ไม่เช่นนั้นบันทึกแล้วคืน False"""
+        if created and self.high_water and created < self.high_water:
+            return True
+        with self._lock:
+            if key in self._keys:
+                self._keys.move_to_end(key)
+                return True
+            self._keys[key] = created
+            if len(self._keys) > self.max_entries:
+                self._keys.popitem(last=False)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(f"{created}\t{key}\n")
+            self._lines += 1
+            if self._lines > 2 * self.max_entries:
+                self._compact()
+            return False
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
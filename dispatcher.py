@@ -0,0 +1,90 @@
+import os, logging, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Hashable, List, Optional
+import metrics
+
+MAX_WORKERS = int(os.getenv("BOT_WORKERS", "5"))
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "merge", "followers")
+
+    def __init__(self, fn: Callable, args: tuple, kwargs: dict, merge: Optional[Hashable]):
+        self.fn, self.args, self.kwargs, self.merge = fn, args, kwargs, merge
+        self.followers: List["_Job"] = []
+
+    def run(self) -> None:
+        result = None
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        finally:
+            # ผลของงานแรกส่งต่อให้งานที่ถูกรวม (งานแรก raise -> merged=None ให้ทำเอง)
+            for f in self.followers:
+                try:
+                    f.fn(*f.args, merged=result, **f.kwargs)
+                except Exception as e:
+                    logging.exception("dispatch merged %s: %s", self.merge, e)
+
+class RouterDispatcher:
+    """
+    รันงานบน thread pool ขนาดจำกัด
+    - งานที่ key เดียวกัน (router IP) รันตามลำดับที่เข้ามา และไม่ทับซ้อนกัน
+    - งานต่าง key รันขนานกันได้
+    - งานที่ระบุ merge เดียวกันและยังรอคิวอยู่ รวมเป็นงานเดียว (คำสั่งอ่านซ้ำๆ ของ router เดียว)
+    """
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="router")
+        self._lock = threading.Lock()
+        self._queues: Dict[Hashable, Deque[_Job]] = {}
+        self._running: Dict[Hashable, bool] = {}
+
+    def submit(self, key: Hashable, fn: Callable, *args, merge: Optional[Hashable] = None, **kwargs) -> None:
+        """
+        merge = key ของงานอ่าน: ถ้ามีงาน merge เดียวกันรอคิวอยู่ใน lane นี้ (ยังไม่เริ่ม) จะไม่ต่อคิวใหม่
+        งานแรกรันครั้งเดียว แล้วงานที่ถูกรวมถูกเรียกต่อทันทีด้วย kwarg merged=ผลของงานแรก
+        """
+        job = _Job(fn, args, kwargs, merge)
+        with self._lock:
+            q = self._queues.setdefault(key, deque())
+            leader = next((j for j in q if merge is not None and j.merge == merge), None)
+            if leader is not None:
+                leader.followers.append(job)
+            else:
+                q.append(job)
+            start = not self._running.get(key)
+            if start:
+                self._running[key] = True
+            self._log_state(key, "merged" if leader is not None else "queued")
+        if leader is not None:
+            metrics.inc("ipa_coalesced_total", op="dispatch")
+        if start:
+            self._pool.submit(self._drain, key)
+
+    def _drain(self, key: Hashable) -> None:
+        while True:
+            with self._lock:
+                q = self._queues.get(key)
+                if not q:
+                    self._running[key] = False
+                    self._queues.pop(key, None)
+                    return
+                job = q.popleft()
+                self._log_state(key, "start")
+            try:
+                job.run()
+            except Exception as e:
+                logging.exception("dispatch %s: %s", key, e)
+
+    def _log_state(self, key: Hashable, event: str) -> None:
+        # เรียกภายใต้ self._lock
+        in_flight = sum(1 for v in self._running.values() if v)
+        logging.info("dispatch %s | router=%s queue=%d in_flight=%d",
+                     event, key, len(self._queues.get(key, ())), in_flight)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {"queues": {str(k): len(v) for k, v in self._queues.items()},
+                    "in_flight": sum(1 for v in self._running.values() if v)}
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
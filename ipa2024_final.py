@@ -1,9 +1,20 @@
-import os, time, logging, requests
-from typing import Dict, Optional, Set
+import os, time, logging, threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
 from dotenv import load_dotenv
 import restconf_final as restconf
 import netconf_final as netconf
 import ansible_final as ansible_runner
+from dispatcher import RouterDispatcher
+import webex_intake
+from dedupe_store import DedupeStore
+from webex_sender import WebexSender
+import config_diff
+import config_archive
+import metrics
+import router_health
+import state_poller
+from results import Outcome, Result
 
 load_dotenv()
 
@@ -13,23 +24,43 @@ STUDENT_ID    = os.getenv("STUDENT_ID", "").strip()
 if not WEBEX_TOKEN or not WEBEX_ROOM_ID or not STUDENT_ID:
     raise SystemExit("Missing env: WEBEX_BOT_TOKEN / WEBEX_ROOM_ID / STUDENT_ID")
 
-BASE = "https://webexapis.com/v1"
+BASE = os.getenv("WEBEX_API_BASE", "https://webexapis.com/v1").rstrip("/")
+INTAKE_MODE = os.getenv("WEBEX_INTAKE", "poll").strip().lower()   # poll | webhook | both
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").strip()                 # public URL ที่ Webex จะเรียกเข้ามา
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "").strip()
+SHOWRUN_REPLY = os.getenv("SHOWRUN_REPLY", "full").strip().lower()    # full | diff
+MOTD_SOURCES = [s.strip() for s in os.getenv("MOTD_SOURCES", "restconf,netconf,cli").split(",") if s.strip()]
+GIGABIT_SOURCES = [s.strip() for s in os.getenv("GIGABIT_SOURCES", "restconf,netconf,cli").split(",") if s.strip()]
 HEADERS = {"Authorization": f"Bearer {WEBEX_TOKEN}"}
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
 ALLOWED_IPS = {f"10.0.15.{i}" for i in range(61, 66)}
+FANOUT_COMMANDS = {"status", "gigabit_status", "motd", "showrun"}
+FANOUT_TIMEOUT = float(os.getenv("FANOUT_TIMEOUT", "60"))
 VALID_COMMANDS = {"create", "delete", "enable", "disable", "status", "showrun", "gigabit_status", "motd"}
 method_state: Dict[str, Optional[str]] = {}
-SEEN_IDS: Set[str] = set()
+SEEN_IDS = DedupeStore()
 
 # ---------- Webex helpers ----------
+# ส่งออกผ่านคิวเบื้องหลัง (webex_sender): handler ไม่ต้องรอ Webex / 429
+SENDER = WebexSender(BASE, WEBEX_TOKEN)
+
+# สิ่งที่งานใน thread นี้ส่งออก (เปิดเฉพาะตอน handle_read อัดไว้ส่งซ้ำให้ข้อความที่ถูก merge)
+_outbox = threading.local()
+
+def _record(*send) -> None:
+    sends = getattr(_outbox, "sends", None)
+    if sends is not None:
+        sends.append(send)
+
 def send_message(text: str) -> None:
-    try:
-        requests.post(f"{BASE}/messages", headers=HEADERS,
-                      json={"roomId": WEBEX_ROOM_ID, "text": text}, timeout=20).raise_for_status()
-    except Exception as e:
-        logging.error("send_message: %s", e)
+    # ข้อผิดพลาดถูกแปลงเป็นข้อความ "Error: ..." -> นับไว้พร้อม label ของคำสั่งที่กำลังทำ
+    if text.startswith(("Error", "Cannot")):
+        metrics.inc("ipa_command_errors_total")
+    SENDER.send_text(WEBEX_ROOM_ID, text)
+    _record("text", text)
 
 def send_long(text: str, chunk=3500):
     for i in range(0, len(text), chunk):
@@ -37,21 +68,23 @@ def send_long(text: str, chunk=3500):
 
 def send_file(filepath: str, caption: str = ""):
     try:
-        with open(filepath, "rb") as f:
-            files = {"files": (os.path.basename(filepath), f, "text/plain")}
-            data = {"roomId": WEBEX_ROOM_ID, "text": caption} if caption else {"roomId": WEBEX_ROOM_ID}
-            requests.post(f"{BASE}/messages", headers={"Authorization": f"Bearer {WEBEX_TOKEN}"},
-                          files=files, data=data, timeout=60).raise_for_status()
+        SENDER.send_file(WEBEX_ROOM_ID, filepath, caption)
+        _record("file", filepath, caption)
     except Exception as e:
         logging.error("send_file: %s", e)
         send_message(f"Error: cannot upload file {os.path.basename(filepath)}")
 
 def list_messages(limit=50):
-    r = requests.get(f"{BASE}/messages", headers=HEADERS,
-                     params={"roomId": WEBEX_ROOM_ID, "max": limit}, timeout=20)
+    r = SENDER.http.get(f"{BASE}/messages",
+                        params={"roomId": WEBEX_ROOM_ID, "max": limit}, timeout=20)
     r.raise_for_status()
     return r.json().get("items", [])
 
+def get_message(message_id: str):
+    r = SENDER.http.get(f"{BASE}/messages/{message_id}", timeout=20)
+    r.raise_for_status()
+    return r.json()
+
 # ---------- Parser ----------
 def parse_text(text: str):
     parts = (text or "").strip().split()
@@ -62,8 +95,8 @@ def parse_text(text: str):
     if len(parts) == 2 and parts[1].lower() in ("restconf", "netconf"):
         out["method_select"] = parts[1].lower()
         return out
-    if len(parts) >= 2 and parts[1].count(".") == 3:
-        out["router_ip"] = parts[1]
+    if len(parts) >= 2 and (parts[1].count(".") == 3 or parts[1].lower() == "all"):
+        out["router_ip"] = parts[1].lower() if parts[1].lower() == "all" else parts[1]
         if len(parts) >= 3:
             out["command"] = parts[2].lower()
     return out
@@ -78,43 +111,290 @@ def fmt_success(cmd, sid, m):
     if cmd == "enable":  return f"{_iface(sid)} is enabled successfully using {M}"
     if cmd == "disable": return f"{_iface(sid)} is shutdowned successfully using {M}"
     return f"Ok: {M}"
-def fmt_status(raw, sid, m):
-    s = (raw or "").lower()
-    if any(k in s for k in ["no interface", "not found", "absent"]):
-        return f"No Interface loopback {sid} {_checked(m)}"
-    if "enabled" in s or "up" in s:  return f"{_iface(sid)} is enabled {_checked(m)}"
-    if any(k in s for k in ["disabled", "shutdown", "down"]):
-        return f"{_iface(sid)} is disabled {_checked(m)}"
-    return f"{_iface(sid)} is {raw} {_checked(m)}"
-def interpret(cmd, sid, m, raw):
-    if cmd == "status": return fmt_status(raw, sid, m)
+def fmt_status(res: Result, sid, m):
+    # ตอบจาก status_cache / state_poller -> บอกอายุข้อมูลในคำตอบด้วย
+    note = f" [{'polled' if res.polled else 'cached'} {res.age:.0f}s ago]" if res.age is not None else ""
+    if res.outcome in (Outcome.NO_INTERFACE, Outcome.NOT_FOUND):
+        return f"No Interface loopback {sid} {_checked(m)}{note}"
+    if res.outcome is Outcome.ENABLED:  return f"{_iface(sid)} is enabled {_checked(m)}{note}"
+    if res.outcome is Outcome.DISABLED: return f"{_iface(sid)} is disabled {_checked(m)}{note}"
+    return f"Error: {_iface(sid)} status unavailable ({res.code or res.outcome.value}) {_checked(m)}"
+SUCCESS = {"create": Outcome.CREATED, "delete": Outcome.DELETED,
+           "enable": Outcome.ENABLED, "disable": Outcome.SHUTDOWNED}
+def interpret(cmd, sid, m, res: Result):
+    if cmd == "status": return fmt_status(res, sid, m)
     cannot = {"create":f"Cannot create: {_iface(sid)}","delete":f"Cannot delete: {_iface(sid)}",
               "enable":f"Cannot enable: {_iface(sid)}","disable":f"Cannot shutdown: {_iface(sid)}"}[cmd]
-    s = (raw or "").lower()
-    if any(k in s for k in ["already exists","cannot","not found","absent","does not exist","error","failed"]):
-        if cmd == "disable" and any(k in s for k in ["not found","no interface","absent"]):
-            return f"{cannot} {_checked(m)}"
-        return cannot
-    return fmt_success(cmd, sid, m)
+    if res.outcome is SUCCESS[cmd]:
+        return fmt_success(cmd, sid, m)
+    if cmd == "disable" and res.outcome in (Outcome.NOT_FOUND, Outcome.NO_INTERFACE):
+        return f"{cannot} {_checked(m)}"
+    return cannot
+
+# ---------- showrun reply ----------
+def _showrun_reply(ip: str, filepath: str, name: str, full: bool):
+    """
+    คืน (ข้อความ, ไฟล์ที่ต้อง upload)
+    โหมด diff: เฉพาะ unified diff เทียบกับ capture ก่อนหน้าของ router นี้ใน config_archive
+    (run_showrun เก็บ capture ปัจจุบันลง archive ไปแล้ว)
+    ครั้งแรก (ยังไม่มีของเก่า) หรือสั่ง "showrun full" จะ upload ไฟล์เต็มเหมือนเดิม
+    """
+    caps = config_archive.recent(ip, 2)
+    if full or len(caps) < 2:
+        return None, filepath
+    diff = config_diff.diff_configs(config_archive.load(caps[1].sha), config_archive.load(caps[0].sha), name)
+    return (f"{name}: changes since last showrun\n{diff}" if diff
+            else f"{name}: no changes since last showrun"), None
+
+def send_showrun(ip: str, filepath: str, name: str, full: bool) -> None:
+    text, upload = _showrun_reply(ip, filepath, name, full)
+    if upload:
+        send_file(upload, name)
+    else:
+        send_long(text)
+
+def _showrun_full(text: str) -> bool:
+    # "/sid ip showrun full" หรือ "/sid ip showrun diff" เลือกโหมดต่อข้อความได้
+    parts = text.strip().split()
+    mode = parts[3].lower() if len(parts) >= 4 and parts[3].lower() in ("full", "diff") else SHOWRUN_REPLY
+    return mode != "diff"
 
 # ---------- Dispatch ----------
 def do_restconf(cmd, ip, sid):
     try:
-        raw = {"create":restconf.create, "delete":restconf.delete, "enable":restconf.enable,
-               "disable":restconf.disable, "status":restconf.status}[cmd](ip, sid)
-        return interpret(cmd, sid, "restconf", raw)
-    except Exception as e: return f"Error: {e}"
+        with metrics.phase("rpc"):
+            raw = {"create":restconf.create, "delete":restconf.delete, "enable":restconf.enable,
+                   "disable":restconf.disable, "status":restconf.status}[cmd](ip, sid)
+        with metrics.phase("interpret"):
+            return interpret(cmd, sid, "restconf", raw)
+    except Exception as e:
+        metrics.inc("ipa_driver_exceptions_total", error=type(e).__name__)
+        return f"Error: {e}"
 
 def do_netconf(cmd, ip, sid):
     try:
-        raw = {"create":netconf.create, "delete":netconf.delete, "enable":netconf.enable,
-               "disable":netconf.disable, "status":netconf.status}[cmd](ip, sid)
-        return interpret(cmd, sid, "netconf", raw)
-    except Exception as e: return f"Error: {e}"
+        with metrics.phase("rpc"):
+            raw = {"create":netconf.create, "delete":netconf.delete, "enable":netconf.enable,
+                   "disable":netconf.disable, "status":netconf.status}[cmd](ip, sid)
+        with metrics.phase("interpret"):
+            return interpret(cmd, sid, "netconf", raw)
+    except Exception as e:
+        metrics.inc("ipa_driver_exceptions_total", error=type(e).__name__)
+        return f"Error: {e}"
+
+def read_motd(ip: str) -> str:
+    """
+    ลำดับตาม MOTD_SOURCES: restconf/netconf = banner ใน Cisco-IOS-XE-native (request เดียว)
+    cli = show banner motd ผ่าน SSH (fallback)
+    """
+    from netmiko_final import get_motd as cli_get_motd
+    readers = {"restconf": restconf.get_motd, "netconf": netconf.get_motd, "cli": cli_get_motd}
+    for src in MOTD_SOURCES:
+        try:
+            with metrics.phase("rpc", protocol=src):
+                msg = readers[src](ip)
+        except Exception as e:
+            if router_health.is_open(ip):
+                return router_health.describe(ip)
+            logging.info("motd %s via %s failed: %s", ip, src, e)
+            continue
+        # อ่านได้แล้ว (แม้ว่างเปล่า) = คำตอบจริงของ router ไม่ต้องลองแหล่งอื่น
+        metrics.relabel(protocol=src)
+        return msg if msg else "Error: No MOTD Configured"
+    return "Error: No MOTD Configured"
+
+def write_motd(ip: str, text: str) -> str:
+    """ตั้ง MOTD ตาม MOTD_SOURCES; cli = ansible playbook (fallback สุดท้าย)"""
+    writers = {"restconf": restconf.set_motd, "netconf": netconf.set_motd, "cli": ansible_runner.run_set_motd}
+    for src in MOTD_SOURCES:
+        try:
+            proto = "ansible" if src == "cli" else src
+            with metrics.phase("rpc", protocol=proto):
+                if writers[src](ip, text):
+                    metrics.relabel(protocol=proto)
+                    return "Ok: success"
+        except Exception as e:
+            if router_health.is_open(ip):
+                return router_health.describe(ip)
+            logging.info("set motd %s via %s failed: %s", ip, src, e)
+    return "Error: Ansible" if MOTD_SOURCES[-1:] == ["cli"] else "Error: MOTD not set"
+
+def read_gigabit_status(ip: str) -> str:
+    """
+    ลำดับแหล่งข้อมูล: state_poller (ถ้าเปิด) -> GIGABIT_SOURCES ตามลำดับ
+    restconf/netconf = ietf-interfaces request เดียว, cli = show ip interface brief (fallback)
+    """
+    polled = state_poller.gigabit_status(ip)
+    if polled:
+        metrics.relabel(protocol="poller")
+        return polled
+    from netmiko_final import gigabit_status as cli_gigabit_status
+    readers = {"restconf": restconf.gigabit_status, "netconf": netconf.gigabit_status,
+               "cli": cli_gigabit_status}
+    err = None
+    for src in GIGABIT_SOURCES:
+        try:
+            with metrics.phase("rpc", protocol=src):
+                msg = readers[src](ip)
+            if msg:
+                metrics.relabel(protocol=src)       # label ตามแหล่งที่ตอบจริง
+                return msg
+        except Exception as e:
+            if router_health.is_open(ip):
+                return router_health.describe(ip)
+            err = e
+            logging.info("gigabit_status %s via %s failed: %s", ip, src, e)
+    return f"Error: {err}" if err else "No GigabitEthernet found"
+
+# ---------- Fan-out ----------
+def resolve_targets(spec: str) -> List[str]:
+    """
+    "all" -> ทุก router ใน ALLOWED_IPS, "10.0.15.61-63" -> ช่วง IP (เฉพาะที่อยู่ใน ALLOWED_IPS),
+    IP เดี่ยว -> [ip]
+    """
+    key = lambda ip: tuple(int(x) for x in ip.split("."))
+    if spec == "all":
+        return sorted(ALLOWED_IPS, key=key)
+    if "-" in spec:
+        prefix, _, rng = spec.rpartition(".")
+        lo, _, hi = rng.partition("-")
+        if lo.isdigit() and hi.isdigit():
+            ips = {f"{prefix}.{i}" for i in range(int(lo), int(hi) + 1)}
+            return sorted(ips & ALLOWED_IPS, key=key)
+        return []
+    return [spec] if spec in ALLOWED_IPS else []
+
+def is_fanout(spec: Optional[str]) -> bool:
+    return bool(spec) and (spec == "all" or "-" in spec)
+
+def _fanout_one(cmd: str, ip: str, sid: str, method: Optional[str], full: bool = False) -> str:
+    if router_health.is_open(ip):
+        return router_health.describe(ip)
+    if cmd == "status":
+        if method == "restconf": return do_restconf(cmd, ip, sid)
+        if method == "netconf":  return do_netconf(cmd, ip, sid)
+        return "Error: No method specified"
+    if cmd == "gigabit_status":
+        return read_gigabit_status(ip)
+    if cmd == "motd":
+        return read_motd(ip)
+    if cmd == "showrun":
+        try:
+            with metrics.phase("rpc"):
+                ok, filepath, router_name = ansible_runner.run_showrun(ip, sid)
+        except router_health.RouterUnreachable as e:
+            return f"Error: {e}"
+        if not (ok and filepath):
+            return "Error: Ansible"
+        name = f"show_run_{sid}_{router_name}.txt"
+        reply, upload = _showrun_reply(ip, filepath, name, full)
+        if upload:
+            # ส่งไฟล์จาก lane ของ router นี้ ก่อนคำสั่งถัดไปใน lane จะเขียนไฟล์ทับ
+            send_file(upload, name)
+        return reply or f"{name} (file attached)"
+    return "Error: No command found."
+
+class _Fanout:
+    """
+    fan-out หนึ่งข้อความ: งานของแต่ละ router เข้า lane ของ router นั้นใน dispatcher
+    (ต่อท้ายคำสั่งที่ค้างคิวอยู่ ไม่แซง) ตอบรวมข้อความเดียวเมื่อครบทุกตัวหรือครบ FANOUT_TIMEOUT
+    """
+    def __init__(self, targets: List[str], cmd: str, sid: str, method: Optional[str], full: bool, labels: dict):
+        self.targets, self.cmd, self.sid, self.method, self.full = targets, cmd, sid, method, full
+        self.labels = labels
+        self.t0 = time.perf_counter()
+        self._results: Dict[str, str] = {}
+        self._protocols = set()
+        self._lock = threading.Lock()
+        self._done = False
+        self._timer = threading.Timer(FANOUT_TIMEOUT, self._finish)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def run(self, ip: str) -> None:
+        with metrics.context(**{**self.labels, "router": ip}):
+            try:
+                res = _fanout_one(self.cmd, ip, self.sid, self.method, self.full)
+            except Exception as e:
+                res = f"Error: {e}"
+            proto = metrics.labels().get("protocol")      # แหล่งที่ตอบจริงของ router นี้
+        with self._lock:
+            if self._done:
+                logging.info("fanout %s %s: finished after timeout, dropped", self.cmd, ip)
+                return
+            self._results[ip] = res
+            if proto:
+                self._protocols.add(proto)
+            last = len(self._results) == len(self.targets)
+        if last:
+            self._finish()
+
+    def _finish(self) -> None:
+        with self._lock:
+            if self._done:
+                return
+            self._done = True
+            results = dict(self._results)
+            protocols = ",".join(sorted(self._protocols)) or None
+        self._timer.cancel()
+        timeout = f"Error: timeout after {FANOUT_TIMEOUT:g}s"
+        lines = [f"{ip}: {results.get(ip, timeout)}" for ip in self.targets]
+        with metrics.context(**{**self.labels, "protocol": protocols or self.labels.get("protocol")}):
+            send_long(f"{self.cmd} on {len(self.targets)} routers:\n" + "\n".join(lines))
+            metrics.observe("ipa_command_seconds", time.perf_counter() - self.t0)
+
+def submit_fanout(dispatcher: RouterDispatcher, text: str, method: Optional[str] = None,
+                  wrap: Callable[[Callable], Callable] = None) -> None:
+    """
+    "/sid all <cmd>" หรือ "/sid 10.0.15.61-63 <cmd>" (อ่านอย่างเดียว)
+    เวลารวม ~ router ที่ช้าที่สุด แทนที่จะเป็นผลรวมทุกตัว
+    """
+    wrap = wrap or (lambda fn: fn)
+    p = parse_text(text)
+    spec, cmd, sid = p.get("router_ip"), p.get("command"), p.get("student_id")
+    method = method or method_state.get(sid)
+    labels = {"router": spec, "command": cmd, "protocol": _protocol(cmd, text, method)}
+    targets = resolve_targets(spec)
+    if not targets:
+        error = "Error: No IP specified"
+    elif cmd not in FANOUT_COMMANDS:
+        error = "Error: No command found."
+    elif cmd == "motd" and len(text.strip().split(" ", 3)) == 4:
+        error = "Error: motd can only be set on one router at a time"
+    else:
+        error = None
+    if error:
+        with metrics.context(**labels):
+            wrap(send_message)(error)
+        return
+    fan = _Fanout(targets, cmd, sid, method, _showrun_full(text), labels)
+    for ip in targets:
+        dispatcher.submit(ip, wrap(fan.run), ip)
 
 # ---------- Core handler ----------
-def handle_text(text: str) -> None:
+# protocol ที่รู้ได้ตั้งแต่รับข้อความ; gigabit_status / motd / showrun ลองหลายแหล่ง -> ตั้ง label ตอนได้คำตอบ (metrics.relabel)
+def _protocol(cmd: Optional[str], text: str, method: Optional[str]) -> Optional[str]:
+    if cmd in ("create", "delete", "enable", "disable", "status"):
+        return method
+    return None
+
+def handle_text(text: str, method: Optional[str] = None) -> None:
+    """จับเวลาทั้งคำสั่ง + ติด label (router / protocol / command) ให้ทุก phase ที่อยู่ข้างใน"""
+    t = time.perf_counter()
     p = parse_text(text)
+    if not p or p.get("student_id") != STUDENT_ID:
+        return          # ข้อความอื่นในห้อง (รวมถึง reply ของบอทเอง) ไม่นับเป็นคำสั่ง
+    metrics.observe("ipa_phase_seconds", time.perf_counter() - t, phase="parse",
+                    router=p.get("router_ip"))
+    cmd = "method" if p.get("method_select") else p.get("command")
+    proto = _protocol(cmd, text, method or method_state.get(p.get("student_id")))
+    with metrics.context(router=p.get("router_ip"), command=cmd, protocol=proto):
+        try:
+            _handle(text, p, method)
+        finally:
+            metrics.observe("ipa_command_seconds", time.perf_counter() - t)
+
+def _handle(text: str, p: dict, method: Optional[str]) -> None:
     if not p or "student_id" not in p:
         return
     sid = p["student_id"]
@@ -137,51 +417,47 @@ def handle_text(text: str) -> None:
         send_message("Error: No command found.")
         return
 
-    
+    if router_health.is_open(ip):
+        # router ไม่ตอบหลายครั้งติดกัน: ตอบทันที ไม่กัน worker ไว้รอ timeout
+        metrics.inc("ipa_circuit_rejected_total")
+        send_message(router_health.describe(ip))
+        return
 
     if cmd == "motd":
         parts = text.strip().split(" ", 3)
         motd_msg = parts[3] if len(parts) == 4 else None
         if motd_msg:
-            try:
-                ok = ansible_runner.run_set_motd(ip, motd_msg)
-                send_message("Ok: success" if ok else "Error: Ansible")
-            except Exception:
-                send_message("Error: Ansible")
+            send_message(write_motd(ip, motd_msg))
         else:
-            try:
-                from netmiko_final import get_motd
-                msg = get_motd(ip)
-                send_message(msg if msg else "Error: No MOTD Configured")
-            except Exception:
-                send_message("Error: No MOTD Configured")
+            send_message(read_motd(ip))
         return
 
     if cmd == "gigabit_status":
-        try:
-            from netmiko_final import gigabit_status
-            msg = gigabit_status(ip)
-            send_message(msg if len(msg) < 3500 else msg[:3500])
-        except Exception as e:
-            send_message(f"Error: {e}")
+        msg = read_gigabit_status(ip)
+        send_message(msg if len(msg) < 3500 else msg[:3500])
         return
 
     if cmd == "showrun":
-        ok, filepath, router_name = ansible_runner.run_showrun(ip, STUDENT_ID)
+        try:
+            with metrics.phase("rpc"):
+                ok, filepath, router_name = ansible_runner.run_showrun(ip, STUDENT_ID)
+        except router_health.RouterUnreachable as e:
+            send_message(f"Error: {e}")
+            return
         if ok and filepath:
-            send_file(filepath, f"show_run_{STUDENT_ID}_{router_name}.txt")
+            send_showrun(ip, filepath, f"show_run_{STUDENT_ID}_{router_name}.txt", _showrun_full(text))
         else:
             send_message("Error: Ansible")
         return
 
-    if method_state.get(sid) is None:
+    method = method or method_state.get(sid)
+    if method is None:
         send_message("Error: No method specified")
         return
     if cmd not in {"create", "delete", "enable", "disable", "status"}:
         send_message("Error: No command found.")
         return
 
-    method = method_state[sid]
     if method == "restconf":
         send_message(do_restconf(cmd, ip, sid))
     elif method == "netconf":
@@ -190,20 +466,100 @@ def handle_text(text: str) -> None:
         send_message("Error: No method specified")
 
 # ---------- Main loop ----------
-def main():
-    logging.info("Bot running | Room=%s | StudentID=%s", WEBEX_ROOM_ID, STUDENT_ID)
-    while True:
+def _merge_key(p: dict, text: str, method: Optional[str]):
+    """key ของคำสั่งอ่านที่ตอบเหมือนกันได้ (router, คำสั่ง, method); None = ห้ามรวม (คำสั่งเขียน)"""
+    cmd = p.get("command")
+    if cmd not in FANOUT_COMMANDS or p.get("method_select"):
+        return None
+    if cmd == "motd" and len(text.strip().split(" ", 3)) == 4:
+        return None
+    mode = _showrun_full(text) if cmd == "showrun" else None
+    return (p.get("router_ip"), cmd, method if cmd == "status" else None, mode)
+
+def handle_read(text: str, method: Optional[str] = None, merged: Optional[list] = None) -> list:
+    """
+    คำสั่งอ่านที่ dispatcher รวมได้: ข้อความแรกถาม router จริงแล้วคืนสิ่งที่ส่งออก
+    ข้อความที่ถูกรวม (merged = สิ่งที่ข้อความแรกส่ง) ได้คำตอบเดียวกันโดยไม่ถาม router ซ้ำ
+    """
+    if merged is None:
+        _outbox.sends = []
         try:
-            for m in reversed(list_messages(50)):
-                key = f"{m.get('id')}:{m.get('updated') or ''}"
-                if key in SEEN_IDS: continue
-                SEEN_IDS.add(key)
-                txt = (m.get("text") or "").strip() or (m.get("markdown") or "").strip()
-                if not txt: continue
-                handle_text(txt)
-        except Exception as e:
-            logging.exception("loop error: %s", e)
-        time.sleep(3)
+            handle_text(text, method)
+            return _outbox.sends
+        finally:
+            _outbox.sends = None
+    p = parse_text(text)
+    cmd = p.get("command")
+    with metrics.context(router=p.get("router_ip"), command=cmd, protocol=_protocol(cmd, text, method)):
+        for kind, *args in merged:
+            (send_message if kind == "text" else send_file)(*args)
+    return merged
+
+def dispatch(dispatcher: RouterDispatcher, text: str, wrap: Callable[[Callable], Callable] = None) -> None:
+    """
+    คำสั่งที่ระบุ router IP ส่งเข้า dispatcher (ขนานกันต่าง router, เรียงลำดับใน router เดียวกัน)
+    fan-out แตกเป็นงานละ router เข้า lane ของแต่ละ router (submit_fanout)
+    คำสั่งอ่านที่ซ้ำกันและยังรอคิวใน lane เดียวกัน รวมเป็น device call เดียว (handle_read)
+    ส่วนคำสั่งเลือก method / คำสั่งผิดรูปแบบ ทำทันทีใน thread หลัก
+    method ถูก snapshot ตอนรับข้อความ เพื่อไม่ให้ /sid netconf ที่ตามมาทีหลังไปเปลี่ยนงานที่ค้างคิว
+    wrap ครอบทุกงานก่อนรัน (bench/replay ใช้จับเวลาต่อข้อความ)
+    """
+    wrap = wrap or (lambda fn: fn)
+    p = parse_text(text)
+    ip = p.get("router_ip")
+    method = method_state.get(STUDENT_ID)
+    if p.get("student_id") == STUDENT_ID and is_fanout(ip):
+        submit_fanout(dispatcher, text, method, wrap)
+        return
+    if not ip or ip not in ALLOWED_IPS or p.get("student_id") != STUDENT_ID:
+        wrap(handle_text)(text)
+        return
+    merge = _merge_key(p, text, method)
+    if merge is not None:
+        dispatcher.submit(ip, wrap(handle_read), text, method, merge=merge)
+        return
+    dispatcher.submit(ip, wrap(handle_text), text, method)
+
+def _observe_poll_delay(m: dict, txt: str) -> None:
+    # เวลาตั้งแต่ผู้ใช้โพสต์ (created ของ Webex) จนบอทได้รับข้อความ
+    try:
+        created = datetime.fromisoformat(m["created"].replace("Z", "+00:00")).timestamp()
+    except (KeyError, ValueError, AttributeError):
+        return
+    p = parse_text(txt)
+    metrics.observe("ipa_phase_seconds", max(0.0, time.time() - created), phase="poll_delay",
+                    router=p.get("router_ip"), command=p.get("command"))
+
+def on_message(dispatcher: RouterDispatcher, m: dict) -> None:
+    # ทั้ง poller และ webhook เรียกเข้ามาที่นี่ อาจมาพร้อมกันจากคนละ thread
+    key = f"{m.get('id')}:{m.get('updated') or ''}"
+    if SEEN_IDS.seen_or_add(key, m.get("created") or ""): return
+    txt = (m.get("text") or "").strip() or (m.get("markdown") or "").strip()
+    if not txt: return
+    _observe_poll_delay(m, txt)
+    dispatch(dispatcher, txt)
+
+def main():
+    logging.info("Bot running | Room=%s | StudentID=%s | Intake=%s", WEBEX_ROOM_ID, STUDENT_ID, INTAKE_MODE)
+    dispatcher = RouterDispatcher()
+    handler = lambda m: on_message(dispatcher, m)
+    metrics.start_http_server()
+    # STATE_POLL_INTERVAL > 0: status / gigabit_status ตอบจากสถานะที่ poll ไว้
+    state_poller.start(sorted(ALLOWED_IPS), track=[f"Loopback{STUDENT_ID}"])
+
+    if INTAKE_MODE in ("webhook", "both"):
+        webex_intake.start_webhook_server(WEBHOOK_PORT, get_message, handler,
+                                          room_id=WEBEX_ROOM_ID, secret=WEBHOOK_SECRET)
+        if WEBHOOK_URL:
+            try:
+                webex_intake.ensure_webhook(BASE, HEADERS, WEBHOOK_URL, WEBEX_ROOM_ID, WEBHOOK_SECRET)
+            except Exception as e:
+                logging.error("webhook register: %s", e)
+        if INTAKE_MODE == "webhook":
+            threading.Event().wait()
+            return
+
+    webex_intake.IncrementalPoller(list_messages, handler).run()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,136 @@
+import os, json, time, bisect, logging, threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))           # 0 = ไม่เปิด endpoint
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+JSON_LOG     = os.getenv("METRICS_JSON_LOG", "").lower() in ("1", "true", "yes")
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+LABELS  = ("router", "protocol", "command")
+
+_lock = threading.Lock()
+_hist: Dict[Tuple[str, Tuple], list] = {}       # (name, labels) -> [bucket counts..., sum, count]
+_counters: Dict[Tuple[str, Tuple], float] = {}
+_gauges: Dict[str, Callable[[], float]] = {}    # name -> ฟังก์ชันอ่านค่าปัจจุบัน (เรียกตอน render)
+_local = threading.local()
+_json_log = logging.getLogger("metrics")
+
+# ---------- context ----------
+def labels() -> Dict[str, str]:
+    """label ของคำสั่งที่ thread นี้กำลังทำอยู่ (router / protocol / command)"""
+    return dict(getattr(_local, "labels", {}))
+
+@contextmanager
+def context(**kw) -> Iterator[None]:
+    prev = labels()
+    _local.labels = {**prev, **{k: v for k, v in kw.items() if v is not None}}
+    try:
+        yield
+    finally:
+        _local.labels = prev
+
+def relabel(**kw) -> None:
+    """แก้ label ของ context ปัจจุบันจนกว่า context จะจบ (เช่น protocol ที่ตอบจริงหลังลองหลายแหล่ง)"""
+    _local.labels = {**labels(), **{k: v for k, v in kw.items() if v is not None}}
+
+def _key(name: str, extra: dict) -> Tuple[str, Tuple]:
+    merged = {**labels(), **{k: v for k, v in extra.items() if v is not None}}
+    return name, tuple(sorted((k, str(v)) for k, v in merged.items()))
+
+# ---------- record ----------
+def observe(name: str, seconds: float, **kw) -> None:
+    key = _key(name, kw)
+    with _lock:
+        h = _hist.get(key)
+        if h is None:
+            h = _hist[key] = [0] * len(BUCKETS) + [0.0, 0]
+        i = bisect.bisect_left(BUCKETS, seconds)
+        if i < len(BUCKETS):
+            h[i] += 1
+        h[-2] += seconds
+        h[-1] += 1
+    if JSON_LOG:
+        _json_log.info(json.dumps({"metric": name, "seconds": round(seconds, 6), **dict(key[1])}))
+
+def gauge(name: str, read: Callable[[], float]) -> None:
+    """ลงทะเบียนค่าที่อ่านได้ ณ เวลานั้น (เช่นความยาวคิว); ชื่อเดิมลงซ้ำ = แทนที่"""
+    with _lock:
+        _gauges[name] = read
+
+def inc(name: str, value: float = 1, **kw) -> None:
+    key = _key(name, kw)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    if JSON_LOG:
+        _json_log.info(json.dumps({"metric": name, "inc": value, **dict(key[1])}))
+
+@contextmanager
+def phase(name: str, **kw) -> Iterator[None]:
+    """จับเวลาช่วงหนึ่งของคำสั่ง -> ipa_phase_seconds{phase=...}"""
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("ipa_phase_seconds", time.perf_counter() - t, phase=name, **kw)
+
+# ---------- exposition ----------
+def _fmt(labels_: Tuple, extra: Optional[Tuple] = None) -> str:
+    items = list(labels_) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in items) + "}"
+
+def render() -> str:
+    """Prometheus text exposition format"""
+    out, typed = [], set()
+    with _lock:
+        hist = {k: list(v) for k, v in _hist.items()}
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+    for (name, lb), h in sorted(hist.items()):
+        if name not in typed:
+            out.append(f"# TYPE {name} histogram"); typed.add(name)
+        cum = 0
+        for b, c in zip(BUCKETS, h):
+            cum += c
+            out.append(f"{name}_bucket{_fmt(lb, ('le', b))} {cum}")
+        out.append(f"{name}_bucket{_fmt(lb, ('le', '+Inf'))} {h[-1]}")
+        out.append(f"{name}_sum{_fmt(lb)} {h[-2]:.6f}")
+        out.append(f"{name}_count{_fmt(lb)} {h[-1]}")
+    for (name, lb), v in sorted(counters.items()):
+        if name not in typed:
+            out.append(f"# TYPE {name} counter"); typed.add(name)
+        out.append(f"{name}{_fmt(lb)} {v:g}")
+    for name, read in sorted(gauges.items()):
+        try:
+            v = read()
+        except Exception as e:
+            logging.debug("gauge %s: %s", name, e)
+            continue
+        out.append(f"# TYPE {name} gauge")
+        out.append(f"{name} {v:g}")
+    return "\n".join(out) + "\n"
+
+def start_http_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    if not port:
+        return None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_response(404); self.end_headers(); return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *a): pass
+
+    srv = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=srv.serve_forever, name="metrics", daemon=True).start()
+    logging.info("metrics on http://%s:%d/metrics", host, port)
+    return srv
@@ -1,11 +1,22 @@
-import os
+import os, time, socket, logging, threading
+from xml.sax.saxutils import escape
+from typing import Callable, Dict, List, Optional, Tuple
 from ncclient import manager
+import metrics
+import status_cache
+import singleflight
+import router_health
+from results import (Outcome, Result, IfState, status_result, loopbacks_from_xml, oper_status_from_xml,
+                     edit_reply, interfaces_from_xml, gigabit_summary, motd_from_xml)
+from ncclient.transport.errors import AuthenticationError, TransportError
+from ncclient.operations.errors import TimeoutExpiredError
+from ncclient.operations.rpc import RPCError
 
 USERNAME = os.getenv("ROUTER_USERNAME", "admin")
 PASSWORD = os.getenv("ROUTER_PASSWORD", "cisco")
+PORT     = int(os.getenv("NETCONF_PORT", "830"))
 
-IETF_IF = "urn:ietf:params:xml:ns:yang:ietf-interfaces"
-NATIVE  = "http://cisco.com/ns/yang/Cisco-IOS-XE-native"
+from results import IETF_IF, NATIVE
 
 def _ifname(sid: str) -> str:
     return f"Loopback{sid}"
@@ -20,143 +31,376 @@ def _sid_ip(sid: str):
     return f"172.{x}.{y}.1", 24
 
 def _connect(host: str):
-    return manager.connect(
-        host=host, port=830,
-        username=USERNAME, password=PASSWORD,
-        hostkey_verify=False, device_params={"name": "csr"},
-        allow_agent=False, look_for_keys=False, timeout=20
-    )
+    with metrics.phase("connect", router=host, protocol="netconf"):
+        # เปิด socket เอง: ncclient แปลงทุก connect error เป็น "Could not open socket" จนแยก refused ไม่ได้
+        sock = socket.create_connection((host, PORT), timeout=20)
+        return manager.connect(
+            host=host, port=PORT, sock=sock,
+            username=USERNAME, password=PASSWORD,
+            hostkey_verify=False, device_params={"name": "csr"},
+            allow_agent=False, look_for_keys=False, timeout=20
+        )
+
+# ---------- session pool ----------
+# เก็บ ncclient manager ไว้ต่อ router IP เพื่อไม่ต้อง SSH + hello ใหม่ทุกคำสั่ง
+SESSION_TTL = float(os.getenv("NETCONF_SESSION_TTL", "300"))
+_POOL: Dict[str, List] = {}             # host -> [manager, last_used]
+_POOL_LOCK = threading.Lock()
+_HOST_LOCKS: Dict[str, threading.RLock] = {}
+_reaper = None
+
+def _host_lock(host: str) -> threading.RLock:
+    with _POOL_LOCK:
+        return _HOST_LOCKS.setdefault(host, threading.RLock())
+
+def _close(mgr) -> None:
+    try:
+        mgr.close_session()
+    except Exception:
+        pass
+
+def _drop(host: str) -> None:
+    with _POOL_LOCK:
+        entry = _POOL.pop(host, None)
+    if entry:
+        _close(entry[0])
+
+def _checkout(host: str):
+    with _POOL_LOCK:
+        entry = _POOL.get(host)
+    if entry and entry[0].connected and time.monotonic() - entry[1] < SESSION_TTL:
+        return entry[0]
+    if entry:
+        _drop(host)
+    mgr = _connect(host)
+    with _POOL_LOCK:
+        _POOL[host] = [mgr, time.monotonic()]
+    _start_reaper()
+    return mgr
+
+def _touch(host: str) -> None:
+    with _POOL_LOCK:
+        if host in _POOL:
+            _POOL[host][1] = time.monotonic()
+
+UNREACHABLE = (TransportError, TimeoutExpiredError, OSError, EOFError)
+# AuthenticationError เป็น subclass ของ TransportError แต่ router ตอบแล้ว (รหัสผิด) ไม่นับเป็นติดต่อไม่ได้
+REACHABLE = (AuthenticationError,)
+
+def _dead_before_send(mgr, err: BaseException) -> bool:
+    # ncclient Session.send: "Not connected to NETCONF server" = RPC ยังไม่ถูกส่งออกไป
+    return isinstance(err, TransportError) and not mgr.connected and "not connected" in str(err).lower()
+
+def _run(host: str, fn: Callable):
+    """
+    เรียก fn(manager) บน session ที่ pool ไว้ (ทีละคำสั่งต่อ router)
+    ลองซ้ำหนึ่งครั้งบน session ใหม่เฉพาะเมื่อ session ที่ pool ไว้ตายก่อนส่ง RPC
+    timeout / EOF ระหว่างรอ reply ไม่ส่งซ้ำ (edit อาจ apply ไปแล้ว) -> ส่ง error ขึ้นไป
+    """
+    router_health.check(host, PORT)     # circuit เปิด: ไม่ต้องรอ lock / connect timeout
+    with _host_lock(host), router_health.guard(host, PORT, UNREACHABLE, exclude=REACHABLE):
+        for attempt in (1, 2):
+            mgr = _checkout(host)
+            try:
+                return fn(mgr)
+            except REACHABLE:
+                _drop(host)
+                raise
+            except UNREACHABLE as e:
+                _drop(host)
+                if attempt == 2 or not _dead_before_send(mgr, e):
+                    raise
+                logging.info("netconf %s: stale session (%s), reconnecting", host, e)
+            finally:
+                _touch(host)
+
+def close_idle(ttl: float = None) -> None:
+    ttl = SESSION_TTL if ttl is None else ttl
+    now = time.monotonic()
+    with _POOL_LOCK:
+        idle = [h for h, (_, used) in _POOL.items() if now - used >= ttl]
+    for h in idle:
+        with _host_lock(h):
+            with _POOL_LOCK:
+                entry = _POOL.get(h)
+                if not entry or now - entry[1] < ttl:
+                    continue
+            _drop(h)
+
+def close_all() -> None:
+    close_idle(0)
+
+def _start_reaper() -> None:
+    global _reaper
+    with _POOL_LOCK:
+        if _reaper is not None:
+            return
+        def loop():
+            while True:
+                time.sleep(max(1.0, SESSION_TTL / 2))
+                close_idle()
+        _reaper = threading.Thread(target=loop, name="netconf-reaper", daemon=True)
+        _reaper.start()
 
 # ---------- existence / enabled checks ----------
-def _get_ietf_if_cfg(mgr, name: str) -> str:
-    subtree = f"""
+# ถามเฉพาะ Loopback ที่ต้องการ (ietf-interfaces + native) ใน get-config เดียว
+# แทนการดึง running-config ทั้งก้อนมาค้นหา string
+# ผลที่อ่านได้เก็บลง status_cache (ใช้ร่วมกับ RESTCONF); การเช็คก่อนเขียนใช้ cache เฉพาะเมื่อ
+# ตั้ง NETCONF_SNAPSHOT_TTL เพราะ config ที่แก้จากนอกบอทจะไม่ผ่าน write-through
+SNAPSHOT_TTL = float(os.getenv("NETCONF_SNAPSHOT_TTL", "0"))   # 0 = ถาม device ทุกครั้ง
+
+def _get_loopback_cfg(mgr, name) -> str:
+    """name = ชื่อเดียวหรือ list ของชื่อ Loopback (bulk ถามทุกตัวใน get-config เดียว)"""
+    names = [name] if isinstance(name, str) else list(name)
+    ietf = f"""
       <interfaces xmlns="{IETF_IF}">
-        <interface><name>{name}</name></interface>
+        {"".join(f"<interface><name>{n}</name></interface>" for n in names)}
       </interfaces>
     """.strip()
-    rsp = mgr.get_config(source="running", filter=("subtree", subtree))
-    return getattr(rsp, "data_xml", str(rsp))
-
-def _get_native_if_cfg(mgr, loop_num: str) -> str:
-    subtree = f"""
+    native = f"""
       <native xmlns="{NATIVE}">
         <interface>
-          <Loopback><name>{loop_num}</name></Loopback>
+          {"".join(f"<Loopback><name>{n.replace('Loopback', '')}</name></Loopback>" for n in names)}
         </interface>
       </native>
     """.strip()
-    rsp = mgr.get_config(source="running", filter=("subtree", subtree))
+    # list = subtree filter เดียวที่มีหลาย top-level element
+    rsp = mgr.get_config(source="running", filter=[ietf, native])
     return getattr(rsp, "data_xml", str(rsp))
 
-def _exists(mgr, name: str) -> bool:
-    loop_num = name.replace("Loopback", "")
-    xml_all = getattr(mgr.get_config(source="running"), "data_xml", "")
-    if f"<name>{name}</name>" in xml_all: return True
-    if f"<Loopback><name>{loop_num}</name>" in xml_all: return True
-    if f"<name>{loop_num}</name></Loopback>" in xml_all: return True
-    if f"<name>{name}</name>" in _get_ietf_if_cfg(mgr, name): return True
-    if f"<name>{loop_num}</name>" in _get_native_if_cfg(mgr, loop_num): return True
-    return False
-
-def _enabled(mgr, name: str):
-    xml_ietf = _get_ietf_if_cfg(mgr, name)
-    if "<enabled>true</enabled>" in xml_ietf:  return True
-    if "<enabled>false</enabled>" in xml_ietf: return False
-    loop_num = name.replace("Loopback", "")
-    xml_native = _get_native_if_cfg(mgr, loop_num)
-    if xml_native:
-        if "<shutdown" in xml_native or "<shutdown/>" in xml_native: return False
-        return True
-    return None
+def _lookup(mgr, host: str, name: str) -> Tuple[bool, Optional[bool]]:
+    snap = status_cache.get(host, name, SNAPSHOT_TTL)
+    if snap:
+        return snap[0], snap[1]
+    exists, en = loopbacks_from_xml(_get_loopback_cfg(mgr, name), [name])[name]
+    _remember(host, name, exists, en)
+    return exists, en
 
-# ---------- commands ----------
-def create(router_ip: str, sid: str):
+def _remember(host: str, name: str, exists: bool, en: Optional[bool]) -> None:
+    status_cache.put(host, name, exists, en)
+
+def _forget(host: str, name: str) -> None:
+    status_cache.invalidate(host, name)
+
+def _exists(mgr, host: str, name: str) -> bool:
+    return _lookup(mgr, host, name)[0]
+
+def _edit(mgr, host: str, name: str, cfg: str) -> Tuple[bool, str]:
+    """(ok, error-tag) ของ edit-config; edit ทุกครั้งทำให้ cache ของ interface นั้นใช้ไม่ได้"""
+    _forget(host, name)
+    try:
+        rsp = mgr.edit_config(target="running", config=cfg)
+    except RPCError as e:
+        return False, e.tag or "rpc-error"
+    return edit_reply(rsp.xml)
+
+# ---------- payloads ----------
+def _iface_xml(sid: str, action: str) -> str:
+    """<interface> หนึ่งตัวของ edit-config (ใช้ทั้งคำสั่งเดี่ยวและ bulk)"""
     name = _ifname(sid)
-    ip, pfx = _sid_ip(sid); netmask = _mask(pfx)
-    with _connect(router_ip) as m:
-        if _exists(m, name):
-            return "already exists"
-        cfg = f"""
-<config>
-  <interfaces xmlns="{IETF_IF}">
+    if action == "create":
+        ip, pfx = _sid_ip(sid)
+        return f"""
     <interface>
       <name>{name}</name>
       <type xmlns:ianaift="urn:ietf:params:xml:ns:yang:iana-if-type">ianaift:softwareLoopback</type>
       <enabled>true</enabled>
       <ipv4 xmlns="urn:ietf:params:xml:ns:yang:ietf-ip">
-        <address><ip>{ip}</ip><netmask>{netmask}</netmask></address>
+        <address><ip>{ip}</ip><netmask>{_mask(pfx)}</netmask></address>
       </ipv4>
-    </interface>
-  </interfaces>
-</config>
-""".strip()
-        r = str(m.edit_config(target="running", config=cfg))
-        if "<ok/>" in r:       return "created"
-        if "data-exists" in r: return "already exists"
-        return r
-
-def delete(router_ip: str, sid: str):
-    name = _ifname(sid)
-    with _connect(router_ip) as m:
-        if not _exists(m, name):
-            return "not found"
-        cfg = f"""
-<config>
-  <interfaces xmlns="{IETF_IF}">
+    </interface>"""
+    if action == "delete":
+        return f"""
     <interface operation="delete">
       <name>{name}</name>
-    </interface>
-  </interfaces>
-</config>
-""".strip()
-        r = str(m.edit_config(target="running", config=cfg))
-        if "<ok/>" in r:  return "deleted"
-        return r
+    </interface>"""
+    return f"""
+    <interface><name>{name}</name><enabled>{"true" if action == "enable" else "false"}</enabled></interface>"""
 
-def enable(router_ip: str, sid: str):
-    name = _ifname(sid)
-    with _connect(router_ip) as m:
-        if not _exists(m, name): return "not found"
-        cfg = f"""
+def _config(*interfaces: str) -> str:
+    return f"""
 <config>
-  <interfaces xmlns="{IETF_IF}">
-    <interface><name>{name}</name><enabled>true</enabled></interface>
+  <interfaces xmlns="{IETF_IF}">{"".join(interfaces)}
   </interfaces>
 </config>
 """.strip()
-        r = str(m.edit_config(target="running", config=cfg))
-        if "<ok/>" in r:  return "enabled"
-        return r
 
-def disable(router_ip: str, sid: str):
+# ---------- commands ----------
+def _write(router_ip: str, sid: str, action: str, precheck: bool, done: Outcome, after) -> Result:
+    """
+    เช็คว่ามี/ไม่มี interface (precheck = ต้องมีอยู่ก่อนหรือไม่) แล้ว edit-config
+    after = (exists, enabled) ที่จะเก็บลง status_cache เมื่อสำเร็จ
+    """
     name = _ifname(sid)
-    with _connect(router_ip) as m:
-        if not _exists(m, name): return "not found"
-        cfg = f"""
-<config>
-  <interfaces xmlns="{IETF_IF}">
-    <interface><name>{name}</name><enabled>false</enabled></interface>
-  </interfaces>
-</config>
-""".strip()
-        r = str(m.edit_config(target="running", config=cfg))
-        if "<ok/>" in r:  return "shutdowned"
-        return r
+    def op(m):
+        if _exists(m, router_ip, name) != precheck:
+            return Result(Outcome.ALREADY_EXISTS if action == "create" else Outcome.NOT_FOUND)
+        ok, tag = _edit(m, router_ip, name, _config(_iface_xml(sid, action)))
+        if ok:
+            _remember(router_ip, name, *after)
+            return Result(done)
+        if tag == "data-exists":  return Result(Outcome.ALREADY_EXISTS, tag)
+        if tag == "data-missing": return Result(Outcome.NOT_FOUND, tag)
+        return Result(Outcome.ERROR, tag)
+    return _run(router_ip, op)
+
+def create(router_ip: str, sid: str) -> Result:
+    return _write(router_ip, sid, "create", False, Outcome.CREATED, (True, True))
+
+def delete(router_ip: str, sid: str) -> Result:
+    return _write(router_ip, sid, "delete", True, Outcome.DELETED, (False, None))
+
+def enable(router_ip: str, sid: str) -> Result:
+    return _write(router_ip, sid, "enable", True, Outcome.ENABLED, (True, True))
+
+def disable(router_ip: str, sid: str) -> Result:
+    return _write(router_ip, sid, "disable", True, Outcome.SHUTDOWNED, (True, False))
 
-def status(router_ip: str, sid: str):
+@singleflight.coalesce("netconf")
+def status(router_ip: str, sid: str) -> Result:
     name = _ifname(sid)
-    with _connect(router_ip) as m:
-        if not _exists(m, name):
-            return "no interface"
-        en = _enabled(m, name)
-        if en is True:  return "enabled"
-        if en is False: return "disabled"
+    cached = status_cache.cached_status(router_ip, name)
+    if cached:
+        return cached          # ไม่ต้อง checkout session เลย
+    def op(m):
+        exists, en = _lookup(m, router_ip, name)
+        if not exists or en is not None:
+            return status_result(exists, en)
         subtree = f"""
           <interfaces-state xmlns="{IETF_IF}">
             <interface><name>{name}</name></interface>
           </interfaces-state>
         """.strip()
-        data = getattr(m.get(filter=("subtree", subtree)), "data_xml", "")
-        if "<oper-status>up</oper-status>" in data:   return "enabled"
-        if "<oper-status>down</oper-status>" in data: return "disabled"
-        return "disabled"
+        up = oper_status_from_xml(m.get(filter=("subtree", subtree)).data_xml, name) == "up"
+        _remember(router_ip, name, True, up)
+        return status_result(True, up)
+    return _run(router_ip, op)
+
+@singleflight.coalesce("netconf")
+def interfaces_state(router_ip: str) -> Dict[str, IfState]:
+    """ทุก interface (config enabled + admin/oper status) ใน <get> เดียว ใช้กับ state_poller"""
+    cfg = f'<interfaces xmlns="{IETF_IF}"/>'
+    st = f'<interfaces-state xmlns="{IETF_IF}"/>'
+    return _run(router_ip, lambda m: interfaces_from_xml(m.get(filter=[cfg, st]).data_xml))
+
+@singleflight.coalesce("netconf")
+def gigabit_status(router_ip: str) -> Optional[str]:
+    """สรุป GigabitEthernet จาก ietf-interfaces (admin + oper ใน <get> เดียว); None = ไม่พบ"""
+    return gigabit_summary(interfaces_state(router_ip))
+
+# ---------- MOTD (Cisco-IOS-XE-native banner) ----------
+@singleflight.coalesce("netconf")
+def get_motd(router_ip: str) -> str:
+    """ข้อความ MOTD ("" = ไม่ได้ตั้งไว้) ใน get-config เดียว"""
+    flt = f'<native xmlns="{NATIVE}"><banner><motd/></banner></native>'
+    return _run(router_ip, lambda m: motd_from_xml(m.get_config(source="running", filter=("subtree", flt)).data_xml))
+
+def set_motd(router_ip: str, text: str) -> bool:
+    cfg = f"""
+<config>
+  <native xmlns="{NATIVE}">
+    <banner><motd><banner>{escape(text)}</banner></motd></banner>
+  </native>
+</config>
+""".strip()
+    def op(m):
+        try:
+            return edit_reply(m.edit_config(target="running", config=cfg).xml)[0]
+        except RPCError as e:
+            logging.info("netconf %s: set motd: %s", router_ip, e.tag or e)
+            return False
+    return _run(router_ip, op)
+
+# ---------- bulk ----------
+# หลาย (sid, action) กับ router เดียว: get-config เดียวเช็คทุกตัว + edit-config เดียว
+# ถ้า device มี :candidate -> แก้ candidate แล้ว commit (ทั้งชุดสำเร็จหรือไม่มีอะไรเปลี่ยน)
+# ถ้ามี :confirmed-commit ด้วย -> commit แบบ confirmed, อ่านตรวจ แล้วค่อย confirm
+#   ตรวจไม่ผ่าน/หลุดกลางทาง router จะ rollback เองเมื่อครบ CONFIRM_TIMEOUT
+CONFIRM_TIMEOUT = int(os.getenv("NETCONF_CONFIRM_TIMEOUT", "60"))
+BULK_RESULTS = {"create": Outcome.CREATED, "delete": Outcome.DELETED,
+                "enable": Outcome.ENABLED, "disable": Outcome.SHUTDOWNED}
+
+def _plan(ops, state: Dict[str, Tuple[bool, Optional[bool]]]):
+    """คืน (ผลต่อ op, [(i, sid, action) ที่ต้องส่ง]) โดยไล่ตาม state ปัจจุบัน"""
+    results, todo, used = [], [], set()
+    for i, (sid, action) in enumerate(ops):
+        name = _ifname(sid)
+        exists = state[name][0]
+        if action not in BULK_RESULTS:
+            res = Result(Outcome.ERROR, "unknown-action")
+        elif name in used:
+            res = Result(Outcome.ERROR, "duplicate-interface")
+        elif action == "create" and exists:
+            res = Result(Outcome.ALREADY_EXISTS)
+        elif action != "create" and not exists:
+            res = Result(Outcome.NOT_FOUND)
+        else:
+            res = None
+            todo.append((i, sid, action))
+            used.add(name)
+        results.append(res)
+    return results, todo
+
+def bulk(router_ip: str, ops: List[Tuple[str, str]]) -> List[Tuple[str, str, Result]]:
+    """
+    ops = [(sid, "create"|"delete"|"enable"|"disable"), ...]
+    คืน [(sid, action, Result)] ตามลำดับเดิม (Outcome เดียวกับคำสั่งเดี่ยว)
+    ใช้เป็น library เท่านั้น (script เตรียม lab / bench) บอทไม่มีคำสั่งที่เรียก bulk
+    """
+    ops = [(str(sid), action.lower()) for sid, action in ops]
+    names = sorted({_ifname(sid) for sid, _ in ops})
+
+    def op(m):
+        state = loopbacks_from_xml(_get_loopback_cfg(m, names), names)
+        results, todo = _plan(ops, state)
+        if not todo:
+            return results
+        cfg = _config(*(_iface_xml(sid, action) for _, sid, action in todo))
+        for _, sid, _a in todo:
+            _forget(router_ip, _ifname(sid))
+        # state ที่ต้องเห็นหลัง commit: (exists, enabled) ; enabled=None = ไม่สนใจ (delete)
+        expect = {_ifname(sid): (action != "delete", None if action == "delete" else action != "disable")
+                  for _, sid, action in todo}
+        try:
+            how = _bulk_edit(m, cfg, expect)
+            err = Result(Outcome.ERROR, "not-confirmed") if how == "unconfirmed" else None
+        except RPCError as e:
+            how, err = "failed", Result(Outcome.ERROR, e.tag or "rpc-error")
+        if err:
+            for i, _s, _a in todo:
+                results[i] = err
+            return results
+        for i, sid, action in todo:
+            results[i] = Result(BULK_RESULTS[action])
+            _remember(router_ip, _ifname(sid), *expect[_ifname(sid)])
+        logging.info("netconf %s: bulk %d/%d changes via %s", router_ip, len(todo), len(ops), how)
+        return results
+
+    return [(sid, action, res) for (sid, action), res in zip(ops, _run(router_ip, op))]
+
+def _bulk_edit(m, cfg: str, expect: Dict[str, Tuple[bool, Optional[bool]]]) -> str:
+    """คืนวิธีที่ใช้ ("running" / "candidate" / "confirmed-commit") หรือ "unconfirmed" ถ้าตรวจไม่ผ่าน"""
+    caps = m.server_capabilities
+    if ":candidate" not in caps:
+        m.edit_config(target="running", config=cfg)
+        return "running"
+    with m.locked("candidate"):
+        m.discard_changes()
+        try:
+            m.edit_config(target="candidate", config=cfg)
+            if ":confirmed-commit" not in caps:
+                m.commit()
+                return "candidate"
+            m.commit(confirmed=True, timeout=str(CONFIRM_TIMEOUT))
+        except RPCError:
+            m.discard_changes()
+            raise
+        # ตรวจผลใน running ก่อน confirm (ทั้ง exists และ enabled); ไม่ตรง = ไม่ confirm ปล่อยให้ router rollback
+        seen = loopbacks_from_xml(_get_loopback_cfg(m, list(expect)), expect)
+        if any(seen[n][0] != exists or (enabled is not None and seen[n][1] != enabled)
+               for n, (exists, enabled) in expect.items()):
+            if ":confirmed-commit:1.1" in caps:
+                m.cancel_commit()
+            return "unconfirmed"
+        m.commit()
+        return "confirmed-commit"
@@ -1,152 +1,267 @@
-import os, re
-from netmiko import ConnectHandler
-from typing import Optional
+import os, re, io, json, time, atexit, logging, threading
+from netmiko import ConnectHandler, ReadException, ReadTimeout, NetmikoTimeoutException
+from typing import Callable, Dict, List, Optional, Tuple
+import metrics
+import singleflight
+import router_health
+from results import summarize_gigabit
 
 USERNAME = os.getenv("ROUTER_USERNAME", "admin")
 PASSWORD = os.getenv("ROUTER_PASSWORD", "cisco")
 NET_TEMPLATES = os.getenv("NET_TEXTFSM")
+PORT = int(os.getenv("SSH_PORT", "22"))
+
+# ---------- timing profiles ----------
+# เก็บเวลาที่ router แต่ละตัวใช้ตอบแต่ละคำสั่ง (EWMA + max) ลงไฟล์ NETMIKO_PROFILE_PATH
+# ใช้กำหนด read_timeout / conn_timeout ต่อ device แทน delay_factor คงที่
+# การอ่านจบเมื่อเจอ prompt (pattern) ไม่ใช่รอเวลาตายตัว
+PROFILE_PATH  = os.getenv("NETMIKO_PROFILE_PATH", ".cli_profiles.json")
+TIMEOUT_MIN   = float(os.getenv("NETMIKO_READ_TIMEOUT_MIN", "5"))
+TIMEOUT_MAX   = float(os.getenv("NETMIKO_READ_TIMEOUT_MAX", "120"))
+PROFILE_SAVE_INTERVAL = 30.0
+_ALPHA = 0.3
+
+_PROFILES: Dict[str, Dict[str, dict]] = {}      # ip -> {คำสั่ง: {"ewma", "max", "n"}}
+_PROFILES_LOCK = threading.Lock()
+_profiles_saved = 0.0
+
+def _load_profiles() -> None:
+    try:
+        with open(PROFILE_PATH, encoding="utf-8") as f:
+            _PROFILES.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+
+def _save_profiles(force: bool = False) -> None:
+    global _profiles_saved
+    now = time.monotonic()
+    with _PROFILES_LOCK:
+        if not force and now - _profiles_saved < PROFILE_SAVE_INTERVAL:
+            return
+        _profiles_saved = now
+        data = json.dumps(_PROFILES, indent=1, sort_keys=True)
+    try:
+        tmp = f"{PROFILE_PATH}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, PROFILE_PATH)
+    except OSError as e:
+        logging.info("netmiko profiles: %s", e)
+
+def _observe(ip: str, key: str, seconds: float) -> None:
+    with _PROFILES_LOCK:
+        st = _PROFILES.setdefault(ip, {}).setdefault(key, {"ewma": seconds, "max": seconds, "n": 0})
+        st["ewma"] = round(st["ewma"] + _ALPHA * (seconds - st["ewma"]), 4)
+        st["max"] = round(max(st["max"], seconds), 4)
+        st["n"] += 1
+    metrics.observe("ipa_cli_seconds", seconds, router=ip, protocol="cli", op=key)
+    _save_profiles()
+
+def _timeout(ip: str, key: str, default: float) -> float:
+    """timeout จาก profile: เผื่อจาก EWMA / max ที่เคยเห็น; ยังไม่มีข้อมูลใช้ default"""
+    with _PROFILES_LOCK:
+        st = _PROFILES.get(ip, {}).get(key)
+    if not st:
+        return default
+    return min(TIMEOUT_MAX, max(TIMEOUT_MIN, 4 * st["ewma"], 2 * st["max"]))
+
+def profiles() -> Dict[str, Dict[str, dict]]:
+    """สำเนา timing profile ทุก router (ใช้ดู/export)"""
+    with _PROFILES_LOCK:
+        return json.loads(json.dumps(_PROFILES))
+
+_load_profiles()
+atexit.register(_save_profiles, True)
 
 def _connect(ip: str):
     dev = {
         "device_type": "cisco_ios",
         "host": ip,
+        "port": PORT,
         "username": USERNAME,
         "password": PASSWORD,
-        "fast_cli": False,
+        "fast_cli": True,
+        "conn_timeout": _timeout(ip, "connect", 10),
     }
-    return ConnectHandler(**dev)
+    t = time.perf_counter()
+    with metrics.phase("connect", router=ip, protocol="cli"):
+        conn = ConnectHandler(**dev)
+    _observe(ip, "connect", time.perf_counter() - t)
+    return conn
 
-def showrun(ip: str) -> str:
-    with _connect(ip) as conn:
-        out = conn.send_command("show running-config", use_textfsm=False, delay_factor=1.2)
-    return out.strip()
+# ---------- session manager ----------
+# เก็บ SSH session ไว้ต่อ router IP: ไม่ต้อง login + prompt discovery + ปิด paging ใหม่ทุกคำสั่ง
+SESSION_TTL = float(os.getenv("NETMIKO_SESSION_TTL", "300"))
+_SESSIONS: Dict[str, List] = {}          # ip -> [connection, last_used]
+_SESSIONS_LOCK = threading.Lock()
+_IP_LOCKS: Dict[str, threading.RLock] = {}
 
-def gigabit_status(ip: str) -> str:
+def _ip_lock(ip: str) -> threading.RLock:
+    with _SESSIONS_LOCK:
+        return _IP_LOCKS.setdefault(ip, threading.RLock())
+
+def _drop(ip: str) -> None:
+    with _SESSIONS_LOCK:
+        entry = _SESSIONS.pop(ip, None)
+    if entry:
+        try:
+            entry[0].disconnect()
+        except Exception:
+            pass
+
+def _checkout(ip: str):
+    with _SESSIONS_LOCK:
+        entry = _SESSIONS.get(ip)
+    if entry and time.monotonic() - entry[1] < SESSION_TTL and entry[0].is_alive():
+        return entry[0]
+    if entry:
+        _drop(ip)
+    conn = _connect(ip)
+    with _SESSIONS_LOCK:
+        _SESSIONS[ip] = [conn, time.monotonic()]
+    return conn
+
+# connect ไม่ได้ / channel เงียบ นับเป็น router ไม่ตอบ (auth fail ไม่นับ)
+UNREACHABLE = (NetmikoTimeoutException, ReadTimeout, OSError, EOFError)
+
+def _run(ip: str, fn: Callable):
     """
-    สรุปสถานะ GigabitEthernet ทั้งหมดเป็นรูป:
-    Gi1 up, Gi2 administratively down, ... -> X up, Y down, Z administratively down
-    * อ่านอย่างเดียว ห้ามเปลี่ยนคอนฟิก (ตามข้อกำหนด)
+    เรียก fn(conn) บน session ที่เปิดค้างไว้ของ router นี้ (หนึ่งคำสั่งบอท = หนึ่ง connection)
+    ถ้า channel ค้าง/ถูกตัด จะเปิดใหม่และลองซ้ำหนึ่งครั้ง
     """
-    import re
-    with _connect(ip) as conn:
-        raw = conn.send_command("show ip interface brief | include GigabitEthernet",
-                                use_textfsm=False, delay_factor=1.0)
-        if not raw.strip():
-            raw = conn.send_command("show ip interface brief",
-                                    use_textfsm=False, delay_factor=1.0)
-
-    lines = []
-    for line in raw.splitlines():
-        s = line.strip()
-        if not s:
-            continue
-        if ("GigabitEthernet" in s) or re.match(r"^Gi[\d/]+", s):
-            lines.append(s)
-
-    if not lines:
-        with _connect(ip) as conn:
-            raw2 = conn.send_command("show interfaces status | include Gi|Gigabit",
-                                     use_textfsm=False, delay_factor=1.0)
-        for line in raw2.splitlines():
-            s = line.strip()
-            if s.startswith(("Gi", "Gigabit")):
-                parts = s.split()
-                if parts:
-                    ifname = parts[0]
-                    stat_l = " ".join(parts[1:]).lower()
-                    if "connected" in stat_l:
-                        status = "up"
-                    elif "disabled" in stat_l or "err-disabled" in stat_l:
-                        status = "administratively down"
-                    else:
-                        status = "down"
-                    lines.append(f"{ifname} - - - {status} -")
-
-    if not lines:
-        return "No GigabitEthernet found"
+    router_health.check(ip, PORT)
+    with _ip_lock(ip), router_health.guard(ip, PORT, UNREACHABLE):
+        for attempt in (1, 2):
+            conn = _checkout(ip)
+            try:
+                return fn(conn)
+            except ReadTimeout:
+                # channel อาจยังมี output ค้าง ใช้ต่อไม่ได้
+                _drop(ip)
+                raise
+            except (OSError, EOFError, ReadException) as e:
+                _drop(ip)
+                if attempt == 2:
+                    raise
+                logging.info("netmiko %s: stale channel (%s), reconnecting", ip, e)
+            finally:
+                with _SESSIONS_LOCK:
+                    if ip in _SESSIONS:
+                        _SESSIONS[ip][1] = time.monotonic()
 
-    items = []
-    for s in lines:
-        parts = s.split()
-        if len(parts) < 5:
-            m = re.match(r"^(GigabitEthernet[\d/]+|Gi[\d/]+)", s)
-            ifname = m.group(1) if m else parts[0]
-            items.append((ifname, "down"))
+def close_all() -> None:
+    with _SESSIONS_LOCK:
+        ips = list(_SESSIONS)
+    for ip in ips:
+        with _ip_lock(ip):
+            _drop(ip)
+
+# ---------- prompt-driven reads ----------
+def _prompt(conn) -> str:
+    return re.escape(conn.base_prompt) + r"[>#]"
+
+def _send(conn, ip: str, cmd: str, default_timeout: float = 10.0) -> str:
+    """
+    ส่งคำสั่งแล้วอ่านจนเจอ prompt ของ router (ไม่เรียก find_prompt ซ้ำทุกคำสั่ง)
+    read_timeout มาจาก profile ของ router นี้
+    """
+    key = cmd.split("|")[0].strip()
+    t = time.perf_counter()
+    out = conn.send_command(cmd, expect_string=_prompt(conn), auto_find_prompt=False,
+                            read_timeout=_timeout(ip, key, default_timeout), use_textfsm=False)
+    _observe(ip, key, time.perf_counter() - t)
+    return out
+
+def _stream(conn, ip: str, cmd: str, sink, default_timeout: float = 60.0) -> None:
+    """
+    output ยาว (show running-config): อ่าน channel เป็น chunk ส่งให้ sink ทันที
+    ตรวจ prompt เฉพาะท้าย buffer แทนการค้นทั้ง output ซ้ำทุกรอบแบบ send_command
+    """
+    key = cmd.split("|")[0].strip()
+    timeout = _timeout(ip, key, default_timeout)
+    prompt = re.compile(_prompt(conn) + r"\s*$")
+    t = time.perf_counter()
+    conn.clear_buffer()
+    conn.write_channel(cmd + conn.RETURN)
+    echo, pending = True, ""
+    hold = len(conn.base_prompt) + 8         # prompt อาจถูกตัดข้าม chunk: กันท้ายไว้ก่อนส่งต่อ
+    while True:
+        chunk = conn.read_channel()
+        if not chunk:
+            if time.perf_counter() - t > timeout:
+                raise ReadTimeout(f"{cmd}: no prompt after {timeout:.0f}s")
+            time.sleep(0.01)
             continue
+        pending += chunk.replace("\r\n", "\n").replace("\r", "")
+        if echo:
+            # บรรทัดแรกคือ echo ของคำสั่ง
+            _, nl, rest = pending.partition("\n")
+            if not nl:
+                continue
+            pending, echo = rest, False
+        m = prompt.search(pending)
+        if m:
+            sink(pending[:m.start()])
+            break
+        if len(pending) > hold:
+            sink(pending[:-hold])
+            pending = pending[-hold:]
+    _observe(ip, key, time.perf_counter() - t)
+
+@singleflight.coalesce("netmiko")
+def showrun(ip: str) -> str:
+    return showrun_with_hostname(ip)[1]
+
+@singleflight.coalesce("netmiko")
+def showrun_with_hostname(ip: str) -> Tuple[str, str]:
+    """
+    ดึง running-config และ hostname ใน session เดียว (ไม่ต้องรัน ios_facts แยก)
+    คืน (hostname, running-config)
+    """
+    def op(conn):
+        buf = io.StringIO()
+        _stream(conn, ip, "show running-config", buf.write)
+        return buf.getvalue(), conn.base_prompt
+    out, prompt = _run(ip, op)
+    m = re.search(r"^hostname\s+(\S+)", out, re.MULTILINE)
+    return (m.group(1) if m else prompt), out.strip()
 
-        ifname = parts[0]
-        status = " ".join(parts[4:-1]).strip().lower() if len(parts) > 5 else parts[4].lower()
+_GI = re.compile(r"^(GigabitEthernet|Gi)(\d[\d/.]*)")
 
+def _brief_rows(raw: str) -> List[Tuple[str, str]]:
+    """[(GigabitEthernetN, up|down|administratively down)] จาก show ip interface brief"""
+    items = []
+    for line in raw.splitlines():
+        parts = line.split()
+        m = _GI.match(parts[0]) if parts else None
+        if not m:
+            continue
+        # Interface IP-Address OK? Method Status Protocol; Status อาจมีสองคำ (administratively down)
+        status = " ".join(parts[4:-1]).lower() if len(parts) >= 6 else ""
         if "administratively down" in status:
             st = "administratively down"
-        elif "up" in status:
+        elif status == "up":
             st = "up"
         else:
             st = "down"
+        items.append((f"GigabitEthernet{m.group(2)}", st))
+    return items
 
-        items.append((ifname, st))
-
-    pieces, up, down, admin = [], 0, 0, 0
-    def _key(t):
-        import re
-        nums = re.findall(r"\d+", t[0])
-        return tuple(int(n) for n in nums) if nums else (9999,)
-    items.sort(key=_key)
-
-    for ifname, st in items:
-        if ifname.startswith("Gi"):
-            ifname = ifname.replace("Gi", "GigabitEthernet")
-        if st == "up":
-            up += 1; pieces.append(f"{ifname} up")
-        elif st == "administratively down":
-            admin += 1; pieces.append(f"{ifname} administratively down")
-        else:
-            down += 1; pieces.append(f"{ifname} down")
-
-    return f"{', '.join(pieces)} -> {up} up, {down} down, {admin} administratively down"
-
+@singleflight.coalesce("netmiko")
+def gigabit_status(ip: str) -> str:
     """
-    ใช้ 'show ip interface brief' (use_textfsm=True ถ้ามี template)
-    ตกแต่งผลลัพธ์ให้อยู่ในรูปแบบที่ระบุ
+    สรุปสถานะ GigabitEthernet ทั้งหมดเป็นรูป:
+    Gi1 up, Gi2 administratively down, ... -> X up, Y down, Z administratively down
+    * อ่านอย่างเดียว ห้ามเปลี่ยนคอนฟิก (ตามข้อกำหนด)
+    ใช้เป็น fallback ของ restconf_final/netconf_final.gigabit_status (ietf-interfaces)
     """
-    with _connect(ip) as conn:
-        try:
-            rows = conn.send_command("show ip interface brief", use_textfsm=True, delay_factor=1.0)
-        except Exception:
-            rows = None
-        if not rows or isinstance(rows, str):
-            raw = conn.send_command("show ip interface brief", use_textfsm=False, delay_factor=1.0)
-            rows = []
-            for line in raw.splitlines():
-                if re.match(r"^(GigabitEthernet|Gi)\S+\s+", line.strip()):
-                    parts = line.split()
-                    if len(parts) >= 6:
-                        rows.append({
-                            "intf": parts[0],
-                            "ipaddr": parts[1],
-                            "status": " ".join(parts[4:-1]) if len(parts) > 5 else parts[4],
-                            "protocol": parts[-1],
-                        })
-
-    gi = [r for r in rows if str(r.get("intf","")).lower().startswith(("gigabit", "gi"))]
-    if not gi:
+    raw = _run(ip, lambda conn: _send(conn, ip, "show ip interface brief | include GigabitEthernet"))
+    items = _brief_rows(raw)
+    if not items:
         return "No GigabitEthernet found"
+    return summarize_gigabit(items)
 
-    pieces = []
-    up = down = admin = 0
-    for r in gi:
-        name = r.get("intf")
-        status = str(r.get("status","")).lower()
-        if "administratively down" in status:
-            pieces.append(f"{name} administratively down"); admin += 1
-        elif "up" in status:
-            pieces.append(f"{name} up"); up += 1
-        else:
-            pieces.append(f"{name} down"); down += 1
-
-    summary = f"{up} up, {down} down, {admin} administratively down"
-    return f"{', '.join(pieces)} -> {summary}"
-
+@singleflight.coalesce("netmiko")
 def get_motd(ip: str) -> Optional[str]:
     """
     อ่าน MOTD บนอุปกรณ์ IOS XE ให้พยายามวิธีที่เสถียรก่อน:
@@ -155,32 +270,34 @@ def get_motd(ip: str) -> Optional[str]:
          รองรับ delimiter ทุกตัว เช่น ^C, !, %, # และหลายบรรทัด
     คืนข้อความ MOTD ถ้าเจอ, ถ้าไม่พบให้คืน None
     """
-    with _connect(ip) as conn:
-        out1 = conn.send_command("show banner motd", use_textfsm=False, delay_factor=1.0)
+    def op(conn):
+        out1 = _send(conn, ip, "show banner motd")
         if out1 is not None:
             s = out1.strip()
             low = s.lower()
             if s and ("no such banner" not in low) and ("not set" not in low):
-                return s
-
-        out2 = conn.send_command("show running-config | section banner motd",
-                                 use_textfsm=False, delay_factor=1.0)
-        if out2 and "banner motd" in out2:
-            m = re.search(r"banner\s+motd\s+(\S)\r?\n(.*?)\r?\n\1",
-                          out2, re.DOTALL | re.IGNORECASE)
-            if m:
-                body = m.group(2).strip()
-                if body:
-                    return body
+                return s, None
+        return None, _send(conn, ip, "show running-config | section banner motd")
+    motd, out2 = _run(ip, op)
+    if motd:
+        return motd
+
+    if out2 and "banner motd" in out2:
+        m = re.search(r"banner\s+motd\s+(\S)\r?\n(.*?)\r?\n\1",
+                      out2, re.DOTALL | re.IGNORECASE)
+        if m:
+            body = m.group(2).strip()
+            if body:
+                return body
 
-            m2 = re.search(r"banner\s+motd\s+(.)(.*?)(?:\r?\n\1|\1\r?\n)$",
-                           out2, re.DOTALL | re.IGNORECASE)
-            if m2:
-                body = m2.group(2).strip()
+        m2 = re.search(r"banner\s+motd\s+(.)(.*?)(?:\r?\n\1|\1\r?\n)$",
+                       out2, re.DOTALL | re.IGNORECASE)
+        if m2:
+            body = m2.group(2).strip()
+            if body:
+                body = re.sub(r"^\s*[\^#!%/|].*\n", "", body).strip()
+                body = re.sub(r"\n\s*[\^#!%/|]\s*$", "", body).strip()
                 if body:
-                    body = re.sub(r"^\s*[\^#!%/|].*\n", "", body).strip()
-                    body = re.sub(r"\n\s*[\^#!%/|]\s*$", "", body).strip()
-                    if body:
-                        return body
+                    return body
 
     return None
@@ -1,8 +1,16 @@
-import os, json, requests
-from requests.auth import HTTPBasicAuth
+import os, json, threading, requests
+from typing import Dict, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import status_cache
+import singleflight
+import router_health
+from results import (Outcome, Result, IfState, http_result, status_result, interface_enabled_from_json,
+                     interfaces_from_json, gigabit_summary, motd_from_json)
 
 USERNAME = os.getenv("ROUTER_USERNAME", "admin")
 PASSWORD = os.getenv("ROUTER_PASSWORD", "cisco")
+PORT     = os.getenv("RESTCONF_PORT", "")
 
 requests.packages.urllib3.disable_warnings()
 
@@ -11,7 +19,56 @@ HEADERS = {
     "Accept": "application/yang-data+json",
 }
 
-def _base(ip): return f"https://{ip}/restconf/data"
+# ---------- pooled sessions ----------
+# requests.Session ต่อ router: keep-alive ทำให้ไม่ต้อง TCP + TLS handshake ใหม่ทุก request
+POOL_CONNECTIONS = int(os.getenv("RESTCONF_POOL_CONNECTIONS", "1"))
+POOL_MAXSIZE     = int(os.getenv("RESTCONF_POOL_MAXSIZE", "4"))
+RETRIES          = int(os.getenv("RESTCONF_RETRIES", "2"))
+BACKOFF          = float(os.getenv("RESTCONF_BACKOFF", "0.3"))
+# connect timeout สั้นแยกจาก read: router ที่ไม่ตอบรู้ผลเร็ว ไม่ต้องรอ read timeout
+CONNECT_TIMEOUT  = float(os.getenv("RESTCONF_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT     = float(os.getenv("RESTCONF_READ_TIMEOUT", "20"))
+
+_SESSIONS: Dict[str, requests.Session] = {}
+_SESSIONS_LOCK = threading.Lock()
+
+def _new_session() -> requests.Session:
+    s = requests.Session()
+    s.auth = (USERNAME, PASSWORD)
+    s.verify = False          # ส่ง verify=False ทุก request ด้วย: REQUESTS_CA_BUNDLE ทับค่านี้
+    s.headers.update(HEADERS)
+    # retry เฉพาะ read error (เช่น connection reset จาก keep-alive ที่ router ปิดไปแล้ว)
+    # และเฉพาะ method idempotent ตาม default ของ urllib3; connect ไม่ได้ไม่ลองซ้ำ ให้ circuit breaker เห็นทันที
+    retry = Retry(total=RETRIES, connect=0, read=RETRIES, other=0, status=0,
+                  backoff_factor=BACKOFF, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS,
+                          pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+def _session(ip: str) -> requests.Session:
+    with _SESSIONS_LOCK:
+        s = _SESSIONS.get(ip)
+        if s is None:
+            s = _SESSIONS[ip] = _new_session()
+        return s
+
+def close_all() -> None:
+    with _SESSIONS_LOCK:
+        sessions = list(_SESSIONS.values()); _SESSIONS.clear()
+    for s in sessions:
+        s.close()
+
+def _request(router_ip: str, method: str, url: str, **kw) -> requests.Response:
+    # connect/read timeout หรือ connection error (หลัง retry ของ adapter) นับเป็น router ไม่ตอบ
+    # ได้ HTTP status ใดๆ กลับมา = router ยังตอบ
+    port = int(PORT) if PORT else 443
+    with router_health.guard(router_ip, port, (requests.ConnectionError, requests.Timeout)):
+        return _session(router_ip).request(method, url, verify=False,
+                                          timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), **kw)
+
+def _base(ip): return f"https://{ip}:{PORT}/restconf/data" if PORT else f"https://{ip}/restconf/data"
 def _ifname(sid): return f"Loopback{sid}"
 
 def _mask(prefix: int) -> str:
@@ -23,18 +80,12 @@ def _sid_ip(sid: str):
     x = int(last3[0]); y = int(last3[1:])
     return f"172.{x}.{y}.1", 24
 
-def create(router_ip: str, sid: str):
+def create(router_ip: str, sid: str) -> Result:
     name = _ifname(sid)
     ip, pfx = _sid_ip(sid)
-    url_if = f"{_base(router_ip)}/ietf-interfaces:interfaces/interface={name}"
-
-    # pre-check
-    r_chk = requests.get(url_if, headers=HEADERS,
-                         auth=HTTPBasicAuth(USERNAME, PASSWORD),
-                         verify=False, timeout=15)
-    if r_chk.status_code == 200:
-        return "already exists"
+    url = f"{_base(router_ip)}/ietf-interfaces:interfaces"
 
+    # POST ไปที่ list: ถ้ามีอยู่แล้ว router ตอบ 409 เอง ไม่ต้อง GET เช็คก่อน
     payload = {
         "ietf-interfaces:interface": {
             "name": name,
@@ -43,54 +94,92 @@ def create(router_ip: str, sid: str):
             "ietf-ip:ipv4": {"address": [{"ip": ip, "netmask": _mask(pfx)}]}
         }
     }
-    r = requests.put(url_if, headers=HEADERS,
-                     auth=HTTPBasicAuth(USERNAME, PASSWORD),
-                     data=json.dumps(payload), verify=False, timeout=20)
-    if r.status_code in (200, 201, 204): return "created"
-    if r.status_code == 409:             return "already exists"
-    if r.status_code == 404:             return "not found"
-    return f"error {r.status_code} {r.text}"
-
-def delete(router_ip: str, sid: str):
+    status_cache.invalidate(router_ip, name)
+    r = _request(router_ip, "POST", url, data=json.dumps(payload))
+    res = http_result(r.status_code, r.text, Outcome.CREATED)
+    if res.outcome is Outcome.CREATED:
+        status_cache.put(router_ip, name, True, True)
+    return res
+
+def delete(router_ip: str, sid: str) -> Result:
     name = _ifname(sid)
     url = f"{_base(router_ip)}/ietf-interfaces:interfaces/interface={name}"
-    r = requests.delete(url, headers=HEADERS,
-                        auth=HTTPBasicAuth(USERNAME, PASSWORD),
-                        verify=False, timeout=20)
-    if r.status_code in (200, 204): return "deleted"
-    if r.status_code == 404:        return "not found"
-    return f"error {r.status_code} {r.text}"
-
-def enable(router_ip: str, sid: str):
+    status_cache.invalidate(router_ip, name)
+    r = _request(router_ip, "DELETE", url)
+    res = http_result(r.status_code, r.text, Outcome.DELETED)
+    if res.outcome in (Outcome.DELETED, Outcome.NOT_FOUND):
+        status_cache.put(router_ip, name, False, None)
+    return res
+
+def enable(router_ip: str, sid: str) -> Result:
     name = _ifname(sid)
     url = f"{_base(router_ip)}/ietf-interfaces:interfaces/interface={name}"
     payload = {"ietf-interfaces:interface": {"enabled": True}}
-    r = requests.patch(url, headers=HEADERS,
-                       auth=HTTPBasicAuth(USERNAME, PASSWORD),
-                       data=json.dumps(payload), verify=False, timeout=20)
-    if r.status_code in (200, 204): return "enabled"
-    if r.status_code == 404:        return "not found"
-    return f"error {r.status_code} {r.text}"
-
-def disable(router_ip: str, sid: str):
+    status_cache.invalidate(router_ip, name)
+    r = _request(router_ip, "PATCH", url, data=json.dumps(payload))
+    res = http_result(r.status_code, r.text, Outcome.ENABLED)
+    if res.outcome is Outcome.ENABLED:
+        status_cache.put(router_ip, name, True, True)
+    elif res.outcome is Outcome.NOT_FOUND:
+        status_cache.put(router_ip, name, False, None)
+    return res
+
+def disable(router_ip: str, sid: str) -> Result:
     name = _ifname(sid)
     url = f"{_base(router_ip)}/ietf-interfaces:interfaces/interface={name}"
     payload = {"ietf-interfaces:interface": {"enabled": False}}
-    r = requests.patch(url, headers=HEADERS,
-                       auth=HTTPBasicAuth(USERNAME, PASSWORD),
-                       data=json.dumps(payload), verify=False, timeout=20)
-    if r.status_code in (200, 204): return "shutdowned"
-    if r.status_code == 404:        return "not found"
-    return f"error {r.status_code} {r.text}"
-
-def status(router_ip: str, sid: str):
+    status_cache.invalidate(router_ip, name)
+    r = _request(router_ip, "PATCH", url, data=json.dumps(payload))
+    res = http_result(r.status_code, r.text, Outcome.SHUTDOWNED)
+    if res.outcome is Outcome.SHUTDOWNED:
+        status_cache.put(router_ip, name, True, False)
+    elif res.outcome is Outcome.NOT_FOUND:
+        status_cache.put(router_ip, name, False, None)
+    return res
+
+@singleflight.coalesce("restconf")
+def status(router_ip: str, sid: str) -> Result:
     name = _ifname(sid)
+    cached = status_cache.cached_status(router_ip, name)
+    if cached:
+        return cached
     url = f"{_base(router_ip)}/ietf-interfaces:interfaces/interface={name}"
-    r = requests.get(url, headers=HEADERS,
-                     auth=HTTPBasicAuth(USERNAME, PASSWORD),
-                     verify=False, timeout=20)
-    if r.status_code == 404: return "no interface"
-    if r.status_code != 200: return f"error {r.status_code} {r.text}"
-    data = r.json().get("ietf-interfaces:interface", {})
-    en = data.get("enabled", False)
-    return "enabled" if en else "disabled"
+    r = _request(router_ip, "GET", url)
+    if r.status_code == 404:
+        status_cache.put(router_ip, name, False, None)
+        return status_result(False, None)
+    if r.status_code != 200:
+        return http_result(r.status_code, r.text, Outcome.ERROR)
+    en = interface_enabled_from_json(r.json())
+    status_cache.put(router_ip, name, True, en)
+    return status_result(True, en)
+
+@singleflight.coalesce("restconf")
+def interfaces_state(router_ip: str) -> Dict[str, IfState]:
+    r = _request(router_ip, "GET", f"{_base(router_ip)}/ietf-interfaces:interfaces-state")
+    if r.status_code != 200:
+        raise RuntimeError(f"restconf interfaces-state: {http_result(r.status_code, r.text, Outcome.ERROR)}")
+    return interfaces_from_json(r.json())
+
+def gigabit_status(router_ip: str) -> Optional[str]:
+    """สรุป GigabitEthernet จาก interfaces-state (admin + oper ของทุก interface ใน request เดียว)"""
+    return gigabit_summary(interfaces_state(router_ip))
+
+# ---------- MOTD (Cisco-IOS-XE-native banner) ----------
+def _motd_url(router_ip: str) -> str:
+    return f"{_base(router_ip)}/Cisco-IOS-XE-native:native/banner/motd"
+
+@singleflight.coalesce("restconf")
+def get_motd(router_ip: str) -> str:
+    """ข้อความ MOTD ("" = ไม่ได้ตั้งไว้) ใน GET เดียว; ตอบผิดปกติ -> exception ให้ผู้เรียก fallback"""
+    r = _request(router_ip, "GET", _motd_url(router_ip))
+    if r.status_code in (204, 404):
+        return ""
+    if r.status_code != 200:
+        raise RuntimeError(f"restconf motd: {http_result(r.status_code, r.text, Outcome.ERROR)}")
+    return motd_from_json(r.json())
+
+def set_motd(router_ip: str, text: str) -> bool:
+    payload = {"Cisco-IOS-XE-native:motd": {"banner": text}}
+    r = _request(router_ip, "PATCH", _motd_url(router_ip), data=json.dumps(payload))
+    return 200 <= r.status_code < 300
@@ -0,0 +1,196 @@
+import io, os, re, json
+from enum import Enum
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+from lxml import etree
+
+# ผลของ driver เป็น enum + error code แทนข้อความ; ipa2024_final.interpret แปลงเป็นคำตอบ
+# decode reply ของ NETCONF ด้วย lxml (namespace-aware) และ JSON ของ RESTCONF เป็นชนิดเดียวกัน
+
+IETF_IF = "urn:ietf:params:xml:ns:yang:ietf-interfaces"
+NATIVE  = "http://cisco.com/ns/yang/Cisco-IOS-XE-native"
+NC_BASE = "urn:ietf:params:xml:ns:netconf:base:1.0"
+
+# reply ใหญ่กว่านี้ใช้ iterparse (ไม่สร้าง tree ทั้งก้อน)
+STREAM_MIN = int(os.getenv("XML_STREAM_MIN", str(256 * 1024)))
+
+class Outcome(str, Enum):
+    CREATED        = "created"
+    ALREADY_EXISTS = "already exists"
+    DELETED        = "deleted"
+    NOT_FOUND      = "not found"
+    ENABLED        = "enabled"
+    SHUTDOWNED     = "shutdowned"
+    DISABLED       = "disabled"
+    NO_INTERFACE   = "no interface"
+    ERROR          = "error"
+
+class Result(NamedTuple):
+    outcome: Outcome
+    code: str = ""                   # error-tag ของ NETCONF / HTTP status ของ RESTCONF
+    age: Optional[float] = None      # ตอบจาก status_cache: อายุข้อมูล (วินาที)
+    polled: bool = False             # ข้อมูลใน cache มาจาก state_poller
+
+    def __str__(self) -> str:
+        return f"{self.outcome.value} {self.code}".strip()
+
+def status_result(exists: bool, enabled: Optional[bool], age: Optional[float] = None) -> Result:
+    if not exists:
+        return Result(Outcome.NO_INTERFACE, age=age)
+    return Result(Outcome.ENABLED if enabled else Outcome.DISABLED, age=age)
+
+# ---------- NETCONF ----------
+def _bytes(xml) -> bytes:
+    return xml.encode() if isinstance(xml, str) else xml
+
+def _loopback_state(ietf, native) -> Tuple[bool, Optional[bool]]:
+    if ietf is None and native is None:
+        return False, None
+    if ietf is not None:
+        en = ietf.findtext(f"{{{IETF_IF}}}enabled")
+        if en == "true":  return True, True
+        if en == "false": return True, False
+    if native is not None:
+        return True, native.find(f"{{{NATIVE}}}shutdown") is None
+    return True, None
+
+def loopbacks_from_xml(xml, names: Iterable[str]) -> Dict[str, Tuple[bool, Optional[bool]]]:
+    """
+    {ชื่อ Loopback: (exists, enabled)} จาก get-config (ietf-interfaces + native) รอบเดียวทุกชื่อ
+    enabled=None ถ้าไม่รู้
+    """
+    names = list(names)
+    want_native = {n.replace("Loopback", ""): n for n in names}
+    ietf: Dict[str, etree._Element] = {}
+    native: Dict[str, etree._Element] = {}
+    data = _bytes(xml)
+    if len(data) >= STREAM_MIN:
+        tags = (f"{{{IETF_IF}}}interface", f"{{{NATIVE}}}Loopback")
+        for _, el in etree.iterparse(io.BytesIO(data), events=("end",), tag=tags):
+            key = el.findtext(f"{{{IETF_IF}}}name") if el.tag == tags[0] else el.findtext(f"{{{NATIVE}}}name")
+            parent = el.getparent()
+            if el.tag == tags[0] and key in names and etree.QName(parent).localname == "interfaces":
+                ietf[key] = el
+            elif el.tag == tags[1] and key in want_native:
+                native[want_native[key]] = el
+            else:
+                el.clear()      # element ที่ไม่เกี่ยวทิ้งทันที
+    else:
+        root = etree.fromstring(data)
+        ns = {"if": IETF_IF, "n": NATIVE}
+        for el in root.xpath("//if:interfaces/if:interface", namespaces=ns):
+            key = el.findtext(f"{{{IETF_IF}}}name")
+            if key in names:
+                ietf[key] = el
+        for el in root.xpath("//n:native/n:interface/n:Loopback", namespaces=ns):
+            key = el.findtext(f"{{{NATIVE}}}name")
+            if key in want_native:
+                native[want_native[key]] = el
+    return {n: _loopback_state(ietf.get(n), native.get(n)) for n in names}
+
+def oper_status_from_xml(xml, name: str) -> Optional[str]:
+    """oper-status ของ interface เดียวจาก <get> interfaces-state ("up", "down", ...)"""
+    root = etree.fromstring(_bytes(xml))
+    found = root.xpath("//if:interfaces-state/if:interface[if:name=$n]/if:oper-status/text()",
+                       namespaces={"if": IETF_IF}, n=name)
+    return str(found[0]).strip() if found else None
+
+class IfState(NamedTuple):
+    enabled: Optional[bool]      # config (ietf-interfaces enabled)
+    admin: str                   # admin-status จาก interfaces-state
+    oper: str                    # oper-status จาก interfaces-state
+
+    @property
+    def brief(self) -> str:
+        """สถานะแบบ show ip interface brief: up / down / administratively down"""
+        if self.admin == "down" or self.enabled is False:
+            return "administratively down"
+        return "up" if self.oper == "up" else "down"
+
+def interfaces_from_xml(xml) -> Dict[str, IfState]:
+    """{ชื่อ: IfState} ทุก interface จาก <get> ที่มีทั้ง interfaces และ interfaces-state"""
+    enabled: Dict[str, Optional[bool]] = {}
+    state: Dict[str, Tuple[str, str]] = {}
+    q = lambda t: f"{{{IETF_IF}}}{t}"
+    data = _bytes(xml)
+    if len(data) >= STREAM_MIN:
+        elements = (el for _, el in etree.iterparse(io.BytesIO(data), events=("end",), tag=q("interface")))
+    else:
+        elements = iter(etree.fromstring(data).iter(q("interface")))
+    for el in elements:
+        name = el.findtext(q("name"))
+        parent = etree.QName(el.getparent()).localname
+        if parent == "interfaces":
+            en = el.findtext(q("enabled"))
+            enabled[name] = None if en is None else en == "true"
+        elif parent == "interfaces-state":
+            state[name] = ((el.findtext(q("admin-status")) or "").strip(),
+                           (el.findtext(q("oper-status")) or "").strip())
+        if len(data) >= STREAM_MIN:
+            el.clear()
+    return {n: IfState(enabled.get(n), *state.get(n, ("", ""))) for n in set(enabled) | set(state)}
+
+_NUM = re.compile(r"\d+")
+
+def summarize_gigabit(items: Iterable[Tuple[str, str]]) -> str:
+    """[(ชื่อ, up|down|administratively down)] -> "Gi1 up, ... -> X up, Y down, Z administratively down" """
+    keyed = []
+    for ifname, st in items:
+        nums = _NUM.findall(ifname)
+        keyed.append((tuple(int(n) for n in nums) if nums else (9999,), ifname, st))
+    keyed.sort()
+    pieces, count = [], {"up": 0, "down": 0, "administratively down": 0}
+    for _, ifname, st in keyed:
+        st = st if st in count else "down"
+        count[st] += 1
+        pieces.append(f"{ifname} {st}")
+    return (f"{', '.join(pieces)} -> {count['up']} up, {count['down']} down, "
+            f"{count['administratively down']} administratively down")
+
+def gigabit_summary(state: Dict[str, IfState]) -> Optional[str]:
+    """สรุปจาก ietf-interfaces (NETCONF/RESTCONF); None = ไม่มี GigabitEthernet"""
+    items = [(n, st.brief) for n, st in state.items() if n.startswith("GigabitEthernet")]
+    return summarize_gigabit(items) if items else None
+
+def motd_from_xml(xml) -> str:
+    """ข้อความ banner motd จาก Cisco-IOS-XE-native; ไม่ได้ตั้งไว้ = "" """
+    root = etree.fromstring(_bytes(xml))
+    found = root.xpath("//n:native/n:banner/n:motd/n:banner/text()", namespaces={"n": NATIVE})
+    return str(found[0]).strip() if found else ""
+
+def edit_reply(xml) -> Tuple[bool, str]:
+    """(ok, error-tag) จาก rpc-reply ของ edit-config / commit"""
+    root = etree.fromstring(_bytes(xml))
+    ns = {"nc": NC_BASE}
+    if root.xpath("//nc:ok", namespaces=ns):
+        return True, ""
+    tags = root.xpath("//nc:rpc-error/nc:error-tag/text()", namespaces=ns)
+    return False, str(tags[0]).strip() if tags else "unknown"
+
+# ---------- RESTCONF ----------
+def http_result(status_code: int, body: str, ok: Outcome) -> Result:
+    """status code -> Result; 404 = NOT_FOUND, 409 = ALREADY_EXISTS, อื่นๆ = ERROR พร้อม error-tag"""
+    if 200 <= status_code < 300: return Result(ok)
+    if status_code == 404:       return Result(Outcome.NOT_FOUND, str(status_code))
+    if status_code == 409:       return Result(Outcome.ALREADY_EXISTS, str(status_code))
+    tag = ""
+    try:
+        err = json.loads(body or "{}").get("ietf-restconf:errors", {}).get("error", [])
+        tag = (err[0] if isinstance(err, list) and err else err or {}).get("error-tag", "")
+    except (ValueError, AttributeError):
+        pass
+    return Result(Outcome.ERROR, f"{status_code} {tag}".strip())
+
+def interfaces_from_json(data: dict) -> Dict[str, IfState]:
+    """{ชื่อ: IfState} จาก GET ietf-interfaces:interfaces-state (ไม่มี config enabled)"""
+    rows = data.get("ietf-interfaces:interfaces-state", {}).get("interface", [])
+    return {r["name"]: IfState(None, r.get("admin-status", ""), r.get("oper-status", ""))
+            for r in rows if "name" in r}
+
+def motd_from_json(data: dict) -> str:
+    return (data.get("Cisco-IOS-XE-native:motd", {}).get("banner") or "").strip()
+
+def interface_enabled_from_json(data: dict) -> bool:
+    itf = data.get("ietf-interfaces:interface", {})
+    if isinstance(itf, list):
+        itf = itf[0] if itf else {}
+    return bool(itf.get("enabled", False))
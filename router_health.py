@@ -0,0 +1,154 @@
+import os, re, time, socket, logging, threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple, Type
+import metrics
+
+# นับความล้มเหลวด้าน "ติดต่อ router ไม่ได้" แยกต่อ endpoint (router IP, port) ของแต่ละ driver
+# ครบ ROUTER_FAIL_THRESHOLD ครั้งติดกัน -> เปิด circuit ของ endpoint นั้น: เรียกซ้ำตอบ "unreachable" ทันที
+# แทนที่จะรอ connect timeout ซ้ำ ๆ; router ทั้งตัวถือว่าล่มเมื่อมี endpoint ที่เปิดและไม่มี endpoint ไหนตอบอยู่
+# (RESTCONF ถูกปิด/ถูก filter ไม่ทำให้ NETCONF / CLI ของ router เดียวกันถูกปฏิเสธ)
+# connection refused = router ตอบ (แค่ไม่เปิด service นั้น) ไม่นับเป็น failure
+# thread probe ลอง TCP connect เบา ๆ ที่ port ของ endpoint ที่เปิด แล้วปิด circuit เมื่อ port นั้นตอบ
+FAIL_THRESHOLD = int(os.getenv("ROUTER_FAIL_THRESHOLD", "2"))
+PROBE_INTERVAL = float(os.getenv("ROUTER_PROBE_INTERVAL", "10"))
+PROBE_TIMEOUT  = float(os.getenv("ROUTER_PROBE_TIMEOUT", "2"))
+# router ที่ถือว่าล่มทั้งตัว probe port ของทุก driver ด้วย (เห็นแค่ port เดียวที่ถูก filter ก็ยังปลดได้)
+PROBE_PORTS = [int(p) for p in os.getenv("ROUTER_PROBE_PORTS", "22,830,443").split(",") if p.strip()]
+
+class RouterUnreachable(Exception):
+    pass
+
+Endpoint = Tuple[str, Optional[int]]
+_STATE: Dict[Endpoint, dict] = {}       # (ip, port) -> {"fails", "opened", "ok", "error"}
+_LOCK = threading.Lock()
+_prober = None
+
+def _entry(ip: str, port: Optional[int]) -> dict:
+    return _STATE.setdefault((ip, port), {"fails": 0, "opened": None, "ok": False, "error": ""})
+
+def _endpoints(ip: str) -> List[dict]:
+    # เรียกภายใต้ _LOCK
+    return [st for (host, _), st in _STATE.items() if host == ip]
+
+def _down(eps: List[dict]) -> bool:
+    return any(st["opened"] is not None for st in eps) and not any(st["ok"] for st in eps)
+
+def is_open(ip: str, port: Optional[int] = None) -> bool:
+    """port=None: router ทั้งตัวล่ม (ไม่มี driver ไหนตอบ), ระบุ port: circuit ของ endpoint นั้น"""
+    with _LOCK:
+        if port is not None:
+            st = _STATE.get((ip, port))
+            return bool(st and st["opened"] is not None)
+        return _down(_endpoints(ip))
+
+def describe(ip: str, port: Optional[int] = None) -> str:
+    with _LOCK:
+        eps = [dict(_STATE[(ip, port)])] if (ip, port) in _STATE else _endpoints(ip)
+        eps = [dict(st) for st in eps if st["opened"] is not None]
+    if not eps:
+        return f"Error: Router {ip} unreachable (no response, down for 0s)"
+    since = time.monotonic() - min(st["opened"] for st in eps)
+    error = max(eps, key=lambda st: st["opened"])["error"] or "no response"
+    return f"Error: Router {ip} unreachable ({error}, down for {since:.0f}s)"
+
+def check(ip: str, port: Optional[int] = None) -> None:
+    if is_open(ip, port):
+        metrics.inc("ipa_circuit_rejected_total", router=ip)
+        raise RouterUnreachable(describe(ip, port)[len("Error: "):])
+
+def record_success(ip: str, port: Optional[int]) -> None:
+    with _LOCK:
+        was_down = _down(_endpoints(ip))
+        st = _entry(ip, port)
+        if st["ok"] and st["fails"] == 0 and st["opened"] is None:
+            return
+        st.update(fails=0, opened=None, ok=True, error="")
+    if was_down:
+        logging.info("router %s reachable again on port %s, circuit closed", ip, port)
+
+_REASON = re.compile(r"timed out|timeout|connection refused|no route to host|"
+                     r"network is unreachable|connection reset|could not open socket|unreachable", re.I)
+
+def _reason(err: BaseException) -> str:
+    # ข้อความ exception ของ requests/ncclient ยาวมาก เก็บเฉพาะสาเหตุที่คนอ่านเข้าใจ
+    m = _REASON.search(str(err))
+    return m.group(0).lower() if m else type(err).__name__
+
+def _refused(err: BaseException) -> bool:
+    # ConnectionRefusedError มักถูกห่อไว้ (requests -> urllib3, netmiko) ไล่ดูทั้ง chain
+    seen = set()
+    while err is not None and id(err) not in seen:
+        seen.add(id(err))
+        if isinstance(err, ConnectionRefusedError) or "connection refused" in str(err).lower():
+            return True
+        err = err.__cause__ or err.__context__
+    return False
+
+def record_failure(ip: str, port: Optional[int], err: BaseException) -> None:
+    if _refused(err):
+        return          # router ตอบ RST: service ปิดอยู่ ไม่ใช่ติดต่อไม่ได้ (ไม่ต้องเปิด circuit / probe)
+    with _LOCK:
+        st = _entry(ip, port)
+        st["fails"] += 1
+        st["ok"] = False
+        st["error"] = _reason(err)
+        opened = st["opened"] is None and st["fails"] >= FAIL_THRESHOLD
+        if opened:
+            st["opened"] = time.monotonic()
+    if opened:
+        metrics.inc("ipa_circuit_open_total", router=ip)
+        logging.warning("router %s port %s: %d consecutive failures, circuit open (%s)",
+                        ip, port, st["fails"], st["error"])
+        _start_prober()
+
+@contextmanager
+def guard(ip: str, port: Optional[int], errors: Tuple[Type[BaseException], ...],
+          exclude: Tuple[Type[BaseException], ...] = ()) -> Iterator[None]:
+    """
+    ครอบการเรียก device หนึ่งครั้งผ่าน port หนึ่ง: circuit ของ endpoint เปิดอยู่ -> RouterUnreachable ทันที
+    exception ใน errors (timeout / connect ไม่ได้) นับเป็น failure ยกเว้นที่อยู่ใน exclude,
+    จบปกติ = router ยังตอบ
+    """
+    check(ip, port)
+    try:
+        yield
+    except (RouterUnreachable,) + tuple(exclude):
+        raise
+    except errors as e:
+        record_failure(ip, port, e)
+        raise
+    else:
+        record_success(ip, port)
+
+def probe(ip: str, port: int) -> bool:
+    """port ตอบ (connect ได้ หรือ refused ทันที) = ติดต่อ router ได้"""
+    try:
+        with socket.create_connection((ip, port), timeout=PROBE_TIMEOUT):
+            return True
+    except ConnectionRefusedError:
+        return True
+    except OSError:
+        return False
+
+def _start_prober() -> None:
+    global _prober
+    with _LOCK:
+        if _prober is not None:
+            return
+        def loop():
+            while True:
+                time.sleep(PROBE_INTERVAL)
+                with _LOCK:
+                    targets = {ep for ep, st in _STATE.items() if st["opened"] is not None and ep[1]}
+                    down = {ip for ip, _ in targets if _down(_endpoints(ip))}
+                targets |= {(ip, port) for ip in down for port in PROBE_PORTS}
+                for ip, port in sorted(targets):
+                    if probe(ip, port):
+                        record_success(ip, port)
+        _prober = threading.Thread(target=loop, name="router-probe", daemon=True)
+        _prober.start()
+
+def stats() -> Dict[str, dict]:
+    with _LOCK:
+        return {f"{ip}:{port}": {"fails": st["fails"], "open": st["opened"] is not None, "error": st["error"]}
+                for (ip, port), st in _STATE.items() if st["fails"] or st["opened"] is not None}
@@ -0,0 +1,58 @@
+import functools, threading
+from typing import Callable, Dict, Hashable
+import metrics
+
+# คำสั่งอ่านที่เหมือนกันและมาพร้อมกัน (router, คำสั่ง, method เดียวกัน) ใช้ device call เดียว
+# คนที่มาทีหลังรอผลของคนแรก แทนที่จะยิงซ้ำไปที่ control plane ของ router
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+_INFLIGHT: Dict[Hashable, _Call] = {}
+_LOCK = threading.Lock()
+
+def do(key: Hashable, fn: Callable, *args, **kwargs):
+    """รัน fn(*args, **kwargs) ครั้งเดียวต่อ key ที่กำลังทำงานอยู่; ทุกคนได้ผล (หรือ exception) เดียวกัน"""
+    with _LOCK:
+        call = _INFLIGHT.get(key)
+        leader = call is None
+        if leader:
+            call = _INFLIGHT[key] = _Call()
+        else:
+            call.waiters += 1
+    if not leader:
+        metrics.inc("ipa_coalesced_total", op=str(key[0]) if isinstance(key, tuple) else str(key))
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+    try:
+        call.result = fn(*args, **kwargs)
+        return call.result
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _LOCK:
+            _INFLIGHT.pop(key, None)
+        call.done.set()
+
+def coalesce(namespace: str) -> Callable:
+    """decorator: key = (namespace.ชื่อฟังก์ชัน, args...) เช่น ("restconf.status", ip, sid)"""
+    def wrap(fn: Callable) -> Callable:
+        op = f"{namespace}.{fn.__name__}"
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            return do((op,) + args + tuple(sorted(kwargs.items())), fn, *args, **kwargs)
+        return inner
+    return wrap
+
+def inflight() -> int:
+    with _LOCK:
+        return len(_INFLIGHT)
@@ -0,0 +1,82 @@
+import os, time, logging, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+import metrics
+import router_health
+import status_cache
+import netconf_final
+from results import IfState, gigabit_summary
+
+# ดึงสถานะ interface ทั้งหมดของแต่ละ router เป็นระยะ (NETCONF <get> เดียว: interfaces + interfaces-state)
+# เก็บไว้ในหน่วยความจำ -> status / gigabit_status ตอบได้โดยไม่ต้องถาม router
+# ข้อมูลเก่ากว่า STATE_MAX_AGE ไม่ใช้ (กลับไปอ่านสดตามเดิม)
+POLL_INTERVAL = float(os.getenv("STATE_POLL_INTERVAL", "0"))           # 0 = ปิด
+MAX_AGE       = float(os.getenv("STATE_MAX_AGE", "0")) or 2 * POLL_INTERVAL
+
+_TABLE: Dict[str, Tuple[float, Dict[str, IfState]]] = {}       # ip -> (เวลาเริ่ม poll, {ชื่อ: IfState})
+_LOCK = threading.Lock()
+_thread = None
+
+def poll_once(ip: str, track: Iterable[str] = ()) -> Dict[str, IfState]:
+    """
+    poll router เดียว แล้วเติม status_cache ของ Loopback ด้วย (track = ชื่อที่ถ้าไม่เจอให้ถือว่าไม่มี)
+    ใช้เวลาเริ่ม poll เป็นเวลาของข้อมูล: write ที่เกิดระหว่าง poll จะไม่ถูกทับ
+    """
+    t0 = time.monotonic()
+    with metrics.phase("poll", router=ip, protocol="netconf"):
+        state = netconf_final.interfaces_state(ip)
+    with _LOCK:
+        _TABLE[ip] = (t0, state)
+    for name, st in state.items():
+        if name.startswith("Loopback"):
+            status_cache.put(ip, name, True, st.brief != "administratively down", at=t0, max_age=MAX_AGE)
+    for name in track:
+        if name not in state:
+            status_cache.put(ip, name, False, None, at=t0, max_age=MAX_AGE)
+    return state
+
+def snapshot(ip: str, max_age: Optional[float] = None) -> Optional[Tuple[Dict[str, IfState], float]]:
+    """(สถานะทุก interface, อายุข้อมูล) หรือ None ถ้ายังไม่มี/เก่าเกิน"""
+    max_age = MAX_AGE if max_age is None else max_age
+    with _LOCK:
+        entry = _TABLE.get(ip)
+    if entry is None:
+        return None
+    age = time.monotonic() - entry[0]
+    return (entry[1], age) if age <= max_age else None
+
+def gigabit_status(ip: str) -> Optional[str]:
+    """สรุป GigabitEthernet จากข้อมูลที่ poll ไว้ พร้อมอายุข้อมูล; None = ต้องอ่านสด"""
+    snap = snapshot(ip)
+    if snap is None:
+        return None
+    state, age = snap
+    summary = gigabit_summary(state)
+    return f"{summary} [polled {age:.0f}s ago]" if summary else None
+
+def start(ips: List[str], track: Iterable[str] = (), interval: float = None) -> Optional[threading.Thread]:
+    global _thread
+    interval = POLL_INTERVAL if interval is None else interval
+    if interval <= 0 or _thread is not None:
+        return None
+    track = list(track)
+
+    def one(ip):
+        if router_health.is_open(ip):
+            return
+        try:
+            poll_once(ip, track)
+        except Exception as e:
+            logging.info("state poll %s: %s", ip, e)
+
+    def loop():
+        pool = ThreadPoolExecutor(max_workers=max(1, len(ips)), thread_name_prefix="state-poll")
+        while True:
+            t = time.monotonic()
+            list(pool.map(one, ips))
+            time.sleep(max(0.0, interval - (time.monotonic() - t)))
+
+    _thread = threading.Thread(target=loop, name="state-poller", daemon=True)
+    _thread.start()
+    logging.info("state poller: %d routers every %.0fs", len(ips), interval)
+    return _thread
@@ -0,0 +1,60 @@
+import os, time, threading
+from typing import Dict, Optional, Tuple
+import metrics
+from results import Result, status_result
+
+# สถานะ loopback ที่อ่านล่าสุดต่อ (router, interface) ใช้ร่วมกันทั้ง RESTCONF / NETCONF
+# status ภายใน STATUS_CACHE_TTL ตอบจากที่นี่; create/delete/enable/disable เขียนทับ (write-through)
+STATUS_CACHE_TTL = float(os.getenv("STATUS_CACHE_TTL", "15"))     # 0 = ปิด
+
+# -> (exists, enabled, t, max_age) ; max_age = อายุที่ status ตอบได้ของ entry จาก state_poller (STATE_MAX_AGE)
+_CACHE: Dict[Tuple[str, str], Tuple[bool, Optional[bool], float, Optional[float]]] = {}
+_LOCK = threading.Lock()
+
+def get(router: str, iface: str, ttl: Optional[float] = None) -> Optional[Tuple[bool, Optional[bool], float]]:
+    """คืน (exists, enabled, age วินาที) ถ้ายังไม่หมดอายุ; enabled=None = ไม่รู้"""
+    ttl = STATUS_CACHE_TTL if ttl is None else ttl
+    if ttl <= 0:
+        return None
+    with _LOCK:
+        entry = _CACHE.get((router, iface))
+    if entry is None:
+        return None
+    age = time.monotonic() - entry[2]
+    return (entry[0], entry[1], age) if age < ttl else None
+
+def put(router: str, iface: str, exists: bool, enabled: Optional[bool], at: Optional[float] = None,
+        max_age: Optional[float] = None) -> None:
+    """
+    at = เวลา (monotonic) ที่อ่านค่านี้ได้; ไม่ทับ entry ที่ใหม่กว่า (เช่นผล poll ที่เริ่มก่อน write)
+    max_age = entry จาก state_poller: status ตอบจาก entry นี้ได้นานเท่านี้ (แทน STATUS_CACHE_TTL)
+    """
+    at = time.monotonic() if at is None else at
+    with _LOCK:
+        cur = _CACHE.get((router, iface))
+        if cur is None or cur[2] <= at:
+            _CACHE[(router, iface)] = (exists, enabled, at, max_age)
+
+def invalidate(router: str, iface: Optional[str] = None) -> None:
+    with _LOCK:
+        if iface is not None:
+            _CACHE.pop((router, iface), None)
+            return
+        for k in [k for k in _CACHE if k[0] == router]:
+            del _CACHE[k]
+
+def cached_status(router: str, iface: str) -> Optional[Result]:
+    """
+    Result ของ status จาก cache (age = อายุข้อมูล, polled = มาจาก state_poller)
+    None = ต้องถาม device (ไม่มี/หมดอายุ/ไม่รู้ว่า enabled หรือไม่)
+    """
+    with _LOCK:
+        entry = _CACHE.get((router, iface))
+    polled = entry is not None and entry[3] is not None
+    ttl = max(STATUS_CACHE_TTL, entry[3]) if polled else STATUS_CACHE_TTL
+    age = time.monotonic() - entry[2] if entry is not None else 0.0
+    if entry is None or ttl <= 0 or age >= ttl or (entry[0] and entry[1] is None):
+        metrics.inc("ipa_status_cache_total", result="miss")
+        return None
+    metrics.inc("ipa_status_cache_total", result="polled" if polled else "hit")
+    return status_result(entry[0], entry[1], age)._replace(polled=polled)
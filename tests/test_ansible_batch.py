@@ -0,0 +1,66 @@
+import os, sys, threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ansible_final import _Batcher
+
+def _run_many(batcher, ips, key="66070273"):
+    out = {}
+    def one(ip):
+        out[ip] = batcher.submit(ip, key, None)
+    threads = [threading.Thread(target=one, args=(ip,)) for ip in ips]
+    for t in threads: t.start()
+    for t in threads: t.join(5)
+    return out
+
+def test_concurrent_requests_share_one_run():
+    runs = []
+    def run_batch(ips, key):
+        runs.append((sorted(ips), key))
+        return {ip: f"{ip}:{key}" for ip in ips}
+    ips = ["10.0.15.61", "10.0.15.62", "10.0.15.63"]
+    out = _run_many(_Batcher(run_batch, window=0.2), ips)
+    assert runs == [(ips, "66070273")]
+    assert out == {ip: f"{ip}:66070273" for ip in ips}
+
+def test_missing_host_gets_default_and_next_batch_starts_fresh():
+    runs = []
+    def run_batch(ips, key):
+        runs.append(sorted(ips))
+        return {ip: True for ip in ips if ip != "10.0.15.62"}
+    b = _Batcher(run_batch, window=0.1)
+    assert _run_many(b, ["10.0.15.61", "10.0.15.62"]) == {"10.0.15.61": True, "10.0.15.62": None}
+    assert b.submit("10.0.15.61", "66070273", None) is True
+    assert runs == [["10.0.15.61", "10.0.15.62"], ["10.0.15.61"]]
+
+def test_failed_run_releases_waiters():
+    def run_batch(ips, key):
+        raise RuntimeError("ansible-playbook not found")
+    out = {}
+    b = _Batcher(run_batch, window=0.1)
+    def leader():
+        try:
+            b.submit("10.0.15.61", "k", False)
+        except RuntimeError:
+            out["leader"] = "raised"
+    t = threading.Thread(target=leader); t.start()
+    while "k" not in b._pending:            # ให้ leader เปิด batch ก่อน
+        pass
+    out["follower"] = b.submit("10.0.15.62", "k", False)
+    t.join(5)
+    assert out == {"leader": "raised", "follower": False}
+
+def test_showrun_labelled_by_engine_that_produced_file(monkeypatch):
+    import ansible_final, metrics
+    def direct(ip, sid):
+        raise RuntimeError("ssh banner timeout")
+    monkeypatch.setattr(ansible_final, "run_showrun_direct", direct)
+    monkeypatch.setattr(ansible_final, "run_showrun_ansible", lambda ip, sid: (True, "f.txt", "R1"))
+    with metrics.context(command="showrun", protocol=None):
+        assert ansible_final.run_showrun("10.0.15.61", "66070273", "direct") == (True, "f.txt", "R1")
+        assert metrics.labels()["protocol"] == "ansible"
+    monkeypatch.setattr(ansible_final, "run_showrun_direct", lambda ip, sid: (True, "f.txt", "R1"))
+    with metrics.context(command="showrun", protocol=None):
+        ansible_final.run_showrun("10.0.15.61", "66070273", "direct")
+        assert metrics.labels()["protocol"] == "cli"
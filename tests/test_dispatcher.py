@@ -0,0 +1,62 @@
+import os, sys, threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dispatcher import RouterDispatcher
+
+def _drain(d):
+    done = threading.Event()
+    d.submit("10.0.15.61", done.set)
+    assert done.wait(5)
+
+def test_identical_queued_reads_run_once():
+    d = RouterDispatcher(2)
+    gate = threading.Event()
+    d.submit("10.0.15.61", gate.wait, 5)           # lane ไม่ว่าง: งานถัดไปค้างคิว
+    calls, got = [], []
+    def read(req, merged=None):
+        if merged is None:
+            calls.append(req)
+            got.append((req, "leader"))
+            return "Interface Loopback66070273 is enabled"
+        got.append((req, merged))
+    for i in range(5):
+        d.submit("10.0.15.61", read, i, merge=("10.0.15.61", "status", "restconf"))
+    d.submit("10.0.15.61", read, 9, merge=("10.0.15.61", "status", "netconf"))
+    gate.set()
+    _drain(d)
+    assert calls == [0, 9]
+    assert got == [(0, "leader")] + [(i, "Interface Loopback66070273 is enabled") for i in range(1, 5)] + [(9, "leader")]
+
+def test_running_job_is_not_merged_into():
+    d = RouterDispatcher(2)
+    started, gate = threading.Event(), threading.Event()
+    calls = []
+    def read(req, merged=None):
+        calls.append((req, merged))
+        if req == 0:
+            started.set(); gate.wait(5)
+        return req
+    key = ("10.0.15.61", "gigabit_status", None)
+    d.submit("10.0.15.61", read, 0, merge=key)
+    assert started.wait(5)
+    d.submit("10.0.15.61", read, 1, merge=key)      # งานแรกเริ่มไปแล้ว: ต้องถาม router ใหม่
+    gate.set()
+    _drain(d)
+    assert calls == [(0, None), (1, None)]
+
+def test_failed_leader_lets_followers_run_themselves():
+    d = RouterDispatcher(2)
+    gate = threading.Event()
+    d.submit("10.0.15.61", gate.wait, 5)
+    calls = []
+    def read(req, merged=None):
+        calls.append((req, merged))
+        if req == 0:
+            raise RuntimeError("boom")
+    for i in range(2):
+        d.submit("10.0.15.61", read, i, merge="k")
+    gate.set()
+    _drain(d)
+    assert calls == [(0, None), (1, None)]
@@ -0,0 +1,29 @@
+import os, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from netconf_final import _plan
+from results import Outcome, Result
+
+STATE = {"Loopback1": (True, True), "Loopback2": (False, None), "Loopback3": (True, False)}
+
+def test_plan_sends_only_valid_changes():
+    results, todo = _plan([("1", "disable"), ("2", "create"), ("3", "enable")], STATE)
+    assert results == [None, None, None]
+    assert todo == [(0, "1", "disable"), (1, "2", "create"), (2, "3", "enable")]
+
+def test_plan_rejects_duplicate_interface():
+    results, todo = _plan([("1", "disable"), ("1", "delete")], STATE)
+    assert results == [None, Result(Outcome.ERROR, "duplicate-interface")]
+    assert todo == [(0, "1", "disable")]
+
+def test_plan_rejects_unknown_action():
+    results, todo = _plan([("1", "reboot"), ("3", "enable")], STATE)
+    assert results == [Result(Outcome.ERROR, "unknown-action"), None]
+    assert todo == [(1, "3", "enable")]
+
+def test_plan_create_on_existing_and_change_on_missing():
+    results, todo = _plan([("1", "create"), ("2", "delete"), ("2", "enable")], STATE)
+    assert results == [Result(Outcome.ALREADY_EXISTS), Result(Outcome.NOT_FOUND), Result(Outcome.NOT_FOUND)]
+    assert todo == []
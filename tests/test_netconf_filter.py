@@ -0,0 +1,37 @@
+import os, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ncclient.operations.util import build_filter
+import netconf_final
+from results import IETF_IF, NATIVE, NC_BASE
+
+class _Mgr:
+    """จับ filter ที่ส่งให้ get_config แล้วสร้าง <filter> ด้วย ncclient จริง"""
+    def __init__(self):
+        self.filter = None
+
+    def get_config(self, source, filter):
+        self.filter = build_filter(filter)
+        return type("Reply", (), {"data_xml": "<data/>"})()
+
+def _roots(flt):
+    assert flt.tag == f"{{{NC_BASE}}}filter" and flt.get("type") == "subtree"
+    return {el.tag: el for el in flt}
+
+def test_loopback_filter_builds_both_roots():
+    m = _Mgr()
+    netconf_final._get_loopback_cfg(m, "Loopback66070273")
+    roots = _roots(m.filter)
+    assert set(roots) == {f"{{{IETF_IF}}}interfaces", f"{{{NATIVE}}}native"}
+    assert roots[f"{{{IETF_IF}}}interfaces"].findtext(f".//{{{IETF_IF}}}name") == "Loopback66070273"
+    assert roots[f"{{{NATIVE}}}native"].findtext(f".//{{{NATIVE}}}Loopback/{{{NATIVE}}}name") == "66070273"
+
+def test_loopback_filter_many_names():
+    m = _Mgr()
+    netconf_final._get_loopback_cfg(m, ["Loopback1", "Loopback2"])
+    roots = _roots(m.filter)
+    names = [el.text for el in roots[f"{{{IETF_IF}}}interfaces"].iter(f"{{{IETF_IF}}}name")]
+    nums = [el.text for el in roots[f"{{{NATIVE}}}native"].iter(f"{{{NATIVE}}}name")]
+    assert names == ["Loopback1", "Loopback2"] and nums == ["1", "2"]
@@ -0,0 +1,57 @@
+import os, sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+for k, v in {"WEBEX_BOT_TOKEN": "token", "WEBEX_ROOM_ID": "room", "STUDENT_ID": "66070273"}.items():
+    os.environ.setdefault(k, v)
+
+from ipa2024_final import interpret
+from results import Outcome, Result
+
+SID = "66070273"
+LO = f"Interface loopback {SID}"
+M = {"restconf": ("Restconf", "(checked by Restconf)"), "netconf": ("Netconf", "(checked by Netconf)")}
+
+# (command, outcome, code) -> คำตอบ; {M} = ชื่อ method, {C} = (checked by ...)
+REPLIES = [
+    ("create",  Outcome.CREATED,        "",    f"{LO} is created successfully using {{M}}"),
+    ("create",  Outcome.ALREADY_EXISTS, "",    f"Cannot create: {LO}"),
+    ("create",  Outcome.ERROR,          "409", f"Cannot create: {LO}"),
+    ("delete",  Outcome.DELETED,        "",    f"{LO} is deleted successfully using {{M}}"),
+    ("delete",  Outcome.NOT_FOUND,      "",    f"Cannot delete: {LO}"),
+    ("delete",  Outcome.ERROR,          "",    f"Cannot delete: {LO}"),
+    ("enable",  Outcome.ENABLED,        "",    f"{LO} is enabled successfully using {{M}}"),
+    ("enable",  Outcome.NOT_FOUND,      "",    f"Cannot enable: {LO}"),
+    ("enable",  Outcome.ERROR,          "",    f"Cannot enable: {LO}"),
+    ("disable", Outcome.SHUTDOWNED,     "",    f"{LO} is shutdowned successfully using {{M}}"),
+    ("disable", Outcome.NOT_FOUND,      "",    f"Cannot shutdown: {LO} {{C}}"),
+    ("disable", Outcome.NO_INTERFACE,   "",    f"Cannot shutdown: {LO} {{C}}"),
+    ("disable", Outcome.ERROR,          "",    f"Cannot shutdown: {LO}"),
+    ("status",  Outcome.ENABLED,        "",    f"{LO} is enabled {{C}}"),
+    ("status",  Outcome.DISABLED,       "",    f"{LO} is disabled {{C}}"),
+    ("status",  Outcome.NO_INTERFACE,   "",    f"No Interface loopback {SID} {{C}}"),
+    ("status",  Outcome.NOT_FOUND,      "",    f"No Interface loopback {SID} {{C}}"),
+    ("status",  Outcome.ERROR,          "503", f"Error: {LO} status unavailable (503) {{C}}"),
+    ("status",  Outcome.ERROR,          "",    f"Error: {LO} status unavailable (error) {{C}}"),
+]
+
+@pytest.mark.parametrize("method", ["restconf", "netconf"])
+@pytest.mark.parametrize("cmd,outcome,code,reply", REPLIES)
+def test_reply_text(cmd, outcome, code, reply, method):
+    name, checked = M[method]
+    assert interpret(cmd, SID, method, Result(outcome, code)) == reply.format(M=name, C=checked)
+
+@pytest.mark.parametrize("method", ["restconf", "netconf"])
+def test_cached_status_reports_age(method):
+    checked = M[method][1]
+    assert interpret("status", SID, method, Result(Outcome.ENABLED, age=4.4)) == \
+        f"{LO} is enabled {checked} [cached 4s ago]"
+    assert interpret("status", SID, method, Result(Outcome.NO_INTERFACE, age=12.0)) == \
+        f"No Interface loopback {SID} {checked} [cached 12s ago]"
+
+@pytest.mark.parametrize("method", ["restconf", "netconf"])
+def test_polled_status_reports_age(method):
+    checked = M[method][1]
+    assert interpret("status", SID, method, Result(Outcome.DISABLED, age=21.2, polled=True)) == \
+        f"{LO} is disabled {checked} [polled 21s ago]"
@@ -0,0 +1,66 @@
+import os, sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import results
+from results import IETF_IF, NATIVE, NC_BASE, IfState, loopbacks_from_xml, interfaces_from_xml
+
+# ทั้งสองทาง: tree (reply เล็ก) และ iterparse (reply >= XML_STREAM_MIN)
+@pytest.fixture(params=["tree", "iterparse"])
+def parse_path(request, monkeypatch):
+    monkeypatch.setattr(results, "STREAM_MIN", 1 if request.param == "iterparse" else 1 << 30)
+    return request.param
+
+def _ietf_if(name, enabled=None, parent="interfaces", admin=None, oper=None):
+    body = f"<name>{name}</name>"
+    if enabled is not None:
+        body += f"<enabled>{'true' if enabled else 'false'}</enabled>"
+    if admin:
+        body += f"<admin-status>{admin}</admin-status><oper-status>{oper}</oper-status>"
+    return f"<interface>{body}</interface>"
+
+def _padding(n=200):
+    return "".join(_ietf_if(f"GigabitEthernet0/{i}", True) for i in range(n))
+
+def test_loopbacks_from_xml(parse_path):
+    xml = (f'<data xmlns="{NC_BASE}">'
+           f'<interfaces xmlns="{IETF_IF}">{_padding()}'
+           f'{_ietf_if("Loopback1", True)}{_ietf_if("Loopback2", False)}</interfaces>'
+           f'<interfaces-state xmlns="{IETF_IF}">{_ietf_if("Loopback4", admin="up", oper="up")}</interfaces-state>'
+           f'<native xmlns="{NATIVE}"><interface>'
+           f'<Loopback><name>3</name><shutdown/></Loopback><Loopback><name>5</name></Loopback>'
+           f'</interface></native></data>')
+    names = ["Loopback1", "Loopback2", "Loopback3", "Loopback4", "Loopback5", "Loopback6"]
+    assert loopbacks_from_xml(xml, names) == {
+        "Loopback1": (True, True),
+        "Loopback2": (True, False),
+        "Loopback3": (True, False),      # native เท่านั้น: shutdown = disabled
+        "Loopback4": (False, None),      # มีแค่ใน interfaces-state ไม่ใช่ config
+        "Loopback5": (True, True),
+        "Loopback6": (False, None),
+    }
+
+def test_loopbacks_from_empty_reply(parse_path):
+    assert loopbacks_from_xml(f'<data xmlns="{NC_BASE}"/>', ["Loopback1"]) == {"Loopback1": (False, None)}
+
+def test_interfaces_from_xml(parse_path):
+    xml = (f'<data xmlns="{NC_BASE}"><interfaces xmlns="{IETF_IF}">{_padding(3)}'
+           f'{_ietf_if("GigabitEthernet2", False)}{_ietf_if("Loopback1")}</interfaces>'
+           f'<interfaces-state xmlns="{IETF_IF}">'
+           f'{_ietf_if("GigabitEthernet0/0", admin="up", oper="up")}'
+           f'{_ietf_if("GigabitEthernet0/1", admin="up", oper="down")}'
+           f'{_ietf_if("GigabitEthernet2", admin="down", oper="down")}'
+           f'{_ietf_if("GigabitEthernet3", admin="up", oper="up")}</interfaces-state></data>')
+    got = interfaces_from_xml(xml)
+    assert got == {
+        "GigabitEthernet0/0": IfState(True, "up", "up"),
+        "GigabitEthernet0/1": IfState(True, "up", "down"),
+        "GigabitEthernet0/2": IfState(True, "", ""),
+        "GigabitEthernet2": IfState(False, "down", "down"),
+        "GigabitEthernet3": IfState(None, "up", "up"),
+        "Loopback1": IfState(None, "", ""),
+    }
+    assert [got[n].brief for n in ("GigabitEthernet0/0", "GigabitEthernet0/1", "GigabitEthernet2")] == \
+        ["up", "down", "administratively down"]
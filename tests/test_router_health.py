@@ -0,0 +1,92 @@
+import os, sys, socket
+import pytest
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+for k, v in {"WEBEX_BOT_TOKEN": "token", "WEBEX_ROOM_ID": "room", "STUDENT_ID": "66070273"}.items():
+    os.environ.setdefault(k, v)
+
+import router_health
+from router_health import RouterUnreachable
+
+IP = "10.0.15.61"
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    monkeypatch.setattr(router_health, "_STATE", {})
+    monkeypatch.setattr(router_health, "_start_prober", lambda: None)
+
+def _fail(port, err=None):
+    with pytest.raises(OSError):
+        with router_health.guard(IP, port, (OSError,)):
+            raise err or socket.timeout("timed out")
+
+def test_refused_is_not_a_failure():
+    wrapped = requests.ConnectionError("HTTPSConnectionPool(host='10.0.15.61', port=443): "
+                                       "[Errno 111] Connection refused")
+    for _ in range(3):
+        router_health.record_failure(IP, 443, wrapped)
+        _fail(830, ConnectionRefusedError(111, "Connection refused"))
+    assert router_health.stats() == {}
+    assert not router_health.is_open(IP, 443) and not router_health.is_open(IP)
+
+def test_refused_found_in_exception_context():
+    try:
+        try:
+            raise ConnectionRefusedError(111, "refused")
+        except OSError:
+            raise EOFError("TCP connection to device failed.")
+    except EOFError as e:
+        assert router_health._refused(e)
+    assert not router_health._refused(socket.timeout("timed out"))
+
+def test_open_port_does_not_block_other_drivers():
+    _fail(443); _fail(443)
+    assert router_health.is_open(IP, 443)
+    with pytest.raises(RouterUnreachable):
+        router_health.check(IP, 443)
+    with router_health.guard(IP, 830, (OSError,)):
+        pass                                     # NETCONF ยังใช้ได้
+    assert not router_health.is_open(IP)
+    assert router_health.is_open(IP, 443)        # RESTCONF ยังปิดอยู่จนกว่า probe จะตอบ
+
+def test_router_down_only_when_no_driver_answers():
+    for port in (443, 830, 22):
+        _fail(port); _fail(port)
+    assert router_health.is_open(IP)
+    assert "timed out" in router_health.describe(IP)
+    router_health.record_success(IP, 22)         # driver ใดตอบ = router กลับมาแล้ว
+    assert not router_health.is_open(IP)
+
+def test_ssh_only_router_keeps_cli_fallback(monkeypatch):
+    import ipa2024_final as bot
+    def timeout_on(port):
+        def read(ip):
+            with router_health.guard(ip, port, (OSError,)):
+                raise socket.timeout("timed out")
+        return read
+    def cli(ip):
+        with router_health.guard(ip, 22, (OSError,)):
+            return "GigabitEthernet1 up"
+    monkeypatch.setattr(bot.state_poller, "gigabit_status", lambda ip: None)
+    monkeypatch.setattr(bot.restconf, "gigabit_status", timeout_on(443))
+    monkeypatch.setattr(bot.netconf, "gigabit_status", timeout_on(830))
+    monkeypatch.setattr("netmiko_final.gigabit_status", cli)
+    for _ in range(4):
+        assert bot.read_gigabit_status(IP) == "GigabitEthernet1 up"
+    assert router_health.is_open(IP, 443) and router_health.is_open(IP, 830)
+    assert not router_health.is_open(IP)
+
+def test_netconf_auth_error_is_not_unreachable():
+    import netconf_final
+    from ncclient.transport.errors import AuthenticationError
+    for _ in range(3):
+        with pytest.raises(AuthenticationError):
+            with router_health.guard(IP, 830, netconf_final.UNREACHABLE, exclude=netconf_final.REACHABLE):
+                raise AuthenticationError("auth failed")
+    assert router_health.stats() == {}
+
+def test_probe_counts_refused_as_reachable():
+    s = socket.socket(); s.bind(("127.0.0.1", 0)); port = s.getsockname()[1]; s.close()
+    assert router_health.probe("127.0.0.1", port)
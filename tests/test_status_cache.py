@@ -0,0 +1,39 @@
+import os, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pytest
+import status_cache
+from results import Outcome
+
+IP, LO = "10.0.15.61", "Loopback66070273"
+
+@pytest.fixture(autouse=True)
+def clean_cache(monkeypatch):
+    monkeypatch.setattr(status_cache, "_CACHE", {})
+
+def test_polled_entry_uses_poller_max_age(monkeypatch):
+    monkeypatch.setattr(status_cache, "STATUS_CACHE_TTL", 15)
+    status_cache.put(IP, LO, True, True, at=time.monotonic() - 40, max_age=60)
+    res = status_cache.cached_status(IP, LO)
+    assert res.outcome is Outcome.ENABLED and res.polled and 40 <= res.age < 41
+
+def test_polled_entry_served_with_cache_disabled(monkeypatch):
+    monkeypatch.setattr(status_cache, "STATUS_CACHE_TTL", 0)
+    status_cache.put(IP, LO, False, None, at=time.monotonic() - 5, max_age=60)
+    assert status_cache.cached_status(IP, LO).outcome is Outcome.NO_INTERFACE
+    status_cache.put(IP, "Loopback1", True, False, at=time.monotonic() - 61, max_age=60)
+    assert status_cache.cached_status(IP, "Loopback1") is None
+
+def test_write_through_replaces_polled_entry(monkeypatch):
+    monkeypatch.setattr(status_cache, "STATUS_CACHE_TTL", 15)
+    status_cache.put(IP, LO, True, True, at=time.monotonic() - 1, max_age=60)
+    status_cache.put(IP, LO, True, False)
+    res = status_cache.cached_status(IP, LO)
+    assert res.outcome is Outcome.DISABLED and not res.polled
+
+def test_pre_write_lookup_ignores_poller_max_age(monkeypatch):
+    monkeypatch.setattr(status_cache, "STATUS_CACHE_TTL", 15)
+    status_cache.put(IP, LO, True, True, at=time.monotonic() - 40, max_age=60)
+    assert status_cache.get(IP, LO) is None
@@ -0,0 +1,29 @@
+import os, sys, time
+from email.utils import formatdate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from webex_sender import WebexSender, _retry_after
+
+def test_retry_after_seconds_date_and_garbage():
+    assert _retry_after("3", 1.0) == 3.0
+    assert _retry_after(None, 1.0) == 1.0
+    assert _retry_after("soon", 1.0) == 1.0
+    assert 20 <= _retry_after(formatdate(time.time() + 30, usegmt=True), 1.0) <= 30
+    assert _retry_after(formatdate(time.time() - 30, usegmt=True), 1.0) == 0.0
+
+def test_worker_survives_unexpected_error(monkeypatch):
+    s = WebexSender("http://webex.invalid", "token", retries=1, backoff=0)
+    calls = []
+    def post(kind, job):
+        calls.append(job["text"])
+        if job["text"] == "boom":
+            raise KeyError("x")
+        return type("R", (), {"status_code": 200, "raise_for_status": lambda self: None})()
+    monkeypatch.setattr(s, "_post", post)
+    s.send_text("room", "boom")
+    s.send_text("room", "ok")
+    s._queue("room").join()
+    assert calls == ["boom", "ok"]
+    assert (s.sent, s.failed) == (1, 1)
@@ -0,0 +1,121 @@
+import os, json, hmac, hashlib, logging, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+MIN_INTERVAL = float(os.getenv("POLL_MIN_INTERVAL", "1"))
+MAX_INTERVAL = float(os.getenv("POLL_MAX_INTERVAL", "15"))
+POLL_PAGE    = int(os.getenv("POLL_PAGE", "5"))
+POLL_MAX     = int(os.getenv("POLL_MAX", "50"))
+
+# ---------- incremental polling ----------
+class IncrementalPoller:
+    """
+    ขอเฉพาะข้อความที่ใหม่กว่าข้อความล่าสุดที่ประมวลผลแล้ว
+    Webex ไม่มี parameter "after" จึงเริ่มขอหน้าเล็ก (POLL_PAGE) แล้วขยายทีละ 4 เท่า
+    จนเจอข้อความล่าสุดที่เคยเห็น หรือครบ POLL_MAX
+    ช่วงเวลา poll ปรับตามความเคลื่อนไหวในห้อง: มีข้อความใหม่ -> MIN_INTERVAL, เงียบ -> ค่อยๆ ยืดถึง MAX_INTERVAL
+    """
+    def __init__(self, fetch: Callable[[int], List[dict]], on_message: Callable[[dict], None],
+                 min_interval: float = MIN_INTERVAL, max_interval: float = MAX_INTERVAL,
+                 page: int = POLL_PAGE, max_page: int = POLL_MAX):
+        self.fetch = fetch                  # fetch(limit) -> items ใหม่สุดก่อน (เหมือน GET /messages)
+        self.on_message = on_message
+        self.min_interval, self.max_interval = min_interval, max_interval
+        self.page, self.max_page = page, max_page
+        self.last_id: Optional[str] = None
+        self.interval = min_interval
+
+    def poll_once(self) -> int:
+        limit = self.page if self.last_id else self.max_page
+        while True:
+            items = self.fetch(limit)
+            ids = [m.get("id") for m in items]
+            if self.last_id in ids or len(items) < limit or limit >= self.max_page:
+                break
+            limit = min(limit * 4, self.max_page)
+        if self.last_id in ids:
+            items = items[:ids.index(self.last_id)]
+        if items:
+            self.last_id = items[0].get("id")
+        for m in reversed(items):
+            self.on_message(m)
+        self.interval = self.min_interval if items else min(self.interval * 1.5, self.max_interval)
+        return len(items)
+
+    def run(self, stop: threading.Event = None) -> None:
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                logging.exception("poll error: %s", e)
+                self.interval = self.max_interval
+            stop.wait(self.interval)
+
+# ---------- webhook receiver ----------
+def _valid_signature(secret: str, body: bytes, signature: str) -> bool:
+    if not secret:
+        return True
+    expected = hmac.new(secret.encode(), body, hashlib.sha1).hexdigest()
+    return hmac.compare_digest(expected, signature or "")
+
+def make_webhook_server(port: int, get_message: Callable[[str], dict],
+                        on_message: Callable[[dict], None], room_id: str = "",
+                        secret: str = "", host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """
+    HTTP endpoint รับ event messages/created ของ Webex
+    webhook ส่งมาแค่ id ของข้อความ จึงต้อง GET /messages/{id} เพื่อเอาตัวข้อความก่อนส่งต่อ
+    ตั้ง room_id แล้ว: ทั้ง event และข้อความที่ดึงมาต้องเป็นของห้องนี้ (ไม่มี roomId = ทิ้ง)
+    """
+    if not secret:
+        logging.warning("webhook: WEBHOOK_SECRET not set, X-Spark-Signature is not checked")
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if not _valid_signature(secret, body, self.headers.get("X-Spark-Signature")):
+                self.send_response(403); self.end_headers()
+                return
+            self.send_response(200); self.end_headers()
+            try:
+                event = json.loads(body or b"{}")
+            except ValueError:
+                return
+            data = event.get("data") or {}
+            if event.get("resource") != "messages" or event.get("event") != "created":
+                return
+            if room_id and data.get("roomId") != room_id:
+                return
+            try:
+                msg = get_message(data["id"])
+                if room_id and msg.get("roomId") != room_id:
+                    logging.warning("webhook %s: message is not from room %s, ignored", data["id"], room_id)
+                    return
+                on_message(msg)
+            except Exception as e:
+                logging.exception("webhook %s: %s", data.get("id"), e)
+
+        def log_message(self, fmt, *args):
+            logging.debug("webhook: " + fmt, *args)
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+def start_webhook_server(*args, **kwargs) -> ThreadingHTTPServer:
+    srv = make_webhook_server(*args, **kwargs)
+    threading.Thread(target=srv.serve_forever, name="webhook", daemon=True).start()
+    logging.info("webhook listening on %s:%d", *srv.server_address[:2])
+    return srv
+
+def ensure_webhook(base: str, headers: Dict[str, str], target_url: str,
+                   room_id: str, secret: str = "", session=None) -> None:
+    """ลงทะเบียน webhook messages/created ของห้องนี้ ถ้ายังไม่มี targetUrl เดียวกัน"""
+    import requests
+    http = session or requests
+    r = http.get(f"{base}/webhooks", headers=headers, timeout=20)
+    r.raise_for_status()
+    if any(w.get("targetUrl") == target_url for w in r.json().get("items", [])):
+        return
+    body = {"name": "ipa-bot", "targetUrl": target_url, "resource": "messages",
+            "event": "created", "filter": f"roomId={room_id}"}
+    if secret:
+        body["secret"] = secret
+    http.post(f"{base}/webhooks", headers=headers, json=body, timeout=20).raise_for_status()
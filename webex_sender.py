@@ -0,0 +1,151 @@
+import os, time, queue, logging, threading, requests
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from requests.adapters import HTTPAdapter
+import metrics
+
+SEND_RETRIES = int(os.getenv("WEBEX_SEND_RETRIES", "5"))
+SEND_BACKOFF = float(os.getenv("WEBEX_SEND_BACKOFF", "1"))
+
+def _retry_after(value: Optional[str], default: float) -> float:
+    """Retry-After เป็นได้ทั้งจำนวนวินาทีและวันที่ HTTP; อ่านไม่ออก = default"""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return default
+
+class WebexSender:
+    """
+    ส่งข้อความ/ไฟล์ออก Webex ผ่านคิวเบื้องหลัง handler แค่ enqueue แล้วกลับได้ทันที
+    - หนึ่งคิว + หนึ่ง thread ต่อห้อง: ลำดับข้อความในห้องเดียวกันไม่สลับ
+    - 429: รอตาม Retry-After แล้วส่งข้อความเดิมซ้ำ (ไม่ข้ามไปข้อความถัดไป)
+    - ใช้ requests.Session เดียว (keep-alive)
+    """
+    def __init__(self, base: str, token: str, retries: int = SEND_RETRIES, backoff: float = SEND_BACKOFF):
+        self.base = base.rstrip("/")
+        self.retries, self.backoff = retries, backoff
+        self.http = requests.Session()
+        self.http.headers["Authorization"] = f"Bearer {token}"
+        self.http.mount("https://", HTTPAdapter(pool_maxsize=4))
+        self.http.mount("http://", HTTPAdapter(pool_maxsize=4))
+        self._queues: Dict[str, "queue.Queue"] = {}
+        self._lock = threading.Lock()
+        self._latency = deque(maxlen=500)
+        self.sent = self.failed = 0         # แก้ภายใต้ self._lock (worker หลายห้อง)
+        metrics.gauge("ipa_webex_queue_depth", self.depth)
+
+    # ---------- enqueue ----------
+    def send_text(self, room_id: str, text: str) -> None:
+        self._queue(room_id).put(("text", time.monotonic(), metrics.labels(),
+                                  {"roomId": room_id, "text": text}))
+
+    def send_file(self, room_id: str, filepath: str, caption: str = "") -> None:
+        # อ่านไฟล์ตอน enqueue: showrun รอบถัดไปอาจเขียนทับไฟล์ก่อนถึงคิวส่ง
+        with open(filepath, "rb") as f:
+            content = f.read()
+        data = {"roomId": room_id, "text": caption} if caption else {"roomId": room_id}
+        self._queue(room_id).put(("file", time.monotonic(), metrics.labels(),
+                                  {"data": data, "name": os.path.basename(filepath), "content": content}))
+
+    def _queue(self, room_id: str) -> "queue.Queue":
+        with self._lock:
+            q = self._queues.get(room_id)
+            if q is None:
+                q = self._queues[room_id] = queue.Queue()
+                threading.Thread(target=self._worker, args=(room_id, q),
+                                 name=f"webex-send-{room_id[-6:]}", daemon=True).start()
+            return q
+
+    # ---------- worker ----------
+    def _worker(self, room_id: str, q: "queue.Queue") -> None:
+        while True:
+            kind, queued_at, labels, job = q.get()
+            try:
+                try:
+                    ok = self._deliver(kind, job)
+                except Exception as e:
+                    # worker เดียวของห้อง: job ที่พังต้องไม่ทำให้คิวหยุดส่งตลอดไป
+                    logging.exception("webex send %s: %s", kind, e)
+                    ok = False
+                if ok:
+                    latency = time.monotonic() - queued_at
+                    with self._lock:
+                        self.sent += 1
+                        self._latency.append(latency)
+                    metrics.observe("ipa_phase_seconds", latency, phase="send", **labels)
+                    logging.info("webex sent %s | depth=%d latency=%.2fs", kind, q.qsize(), latency)
+                else:
+                    with self._lock:
+                        self.failed += 1
+                    if kind == "file":
+                        try:
+                            self._deliver("text", {"roomId": room_id,
+                                                   "text": f"Error: cannot upload file {job['name']}"})
+                        except Exception as e:
+                            logging.exception("webex send text: %s", e)
+            finally:
+                q.task_done()
+
+    def _post(self, kind: str, job: dict) -> requests.Response:
+        if kind == "file":
+            files = {"files": (job["name"], job["content"], "text/plain")}
+            return self.http.post(f"{self.base}/messages", files=files, data=job["data"], timeout=60)
+        return self.http.post(f"{self.base}/messages", json=job, timeout=20)
+
+    def _deliver(self, kind: str, job: dict) -> bool:
+        # 429 ไม่นับเป็น attempt: รอตาม Retry-After ไปเรื่อยๆ จนส่งได้
+        delay, attempt = self.backoff, 0
+        while attempt < self.retries:
+            try:
+                r = self._post(kind, job)
+                if r.status_code == 429:
+                    wait = _retry_after(r.headers.get("Retry-After"), delay)
+                    logging.warning("webex 429, retry after %.1fs", wait)
+                    time.sleep(wait)
+                    continue
+                if r.status_code < 500:
+                    r.raise_for_status()
+                    return True
+                logging.warning("webex send %s: HTTP %d", kind, r.status_code)
+            except requests.HTTPError as e:
+                logging.error("webex send %s: %s", kind, e)
+                return False
+            except requests.RequestException as e:
+                logging.warning("webex send %s attempt %d: %s", kind, attempt + 1, e)
+            attempt += 1
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+        return False
+
+    # ---------- observability ----------
+    def depth(self, room_id: Optional[str] = None) -> int:
+        with self._lock:
+            qs = [self._queues[room_id]] if room_id in self._queues else \
+                 ([] if room_id else list(self._queues.values()))
+        return sum(q.qsize() for q in qs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lat = sorted(self._latency)
+            sent, failed = self.sent, self.failed
+        pct = lambda p: lat[min(len(lat) - 1, int(p * len(lat)))] if lat else 0.0
+        return {"depth": self.depth(), "sent": sent, "failed": failed,
+                "latency_p50": pct(0.50), "latency_p95": pct(0.95)}
+
+    def flush(self, timeout: float = 30) -> bool:
+        """รอจนคิวทุกห้องว่าง (ใช้ตอนปิดโปรแกรม/ทดสอบ)"""
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            with self._lock:
+                busy = any(q.unfinished_tasks for q in self._queues.values())
+            if not busy:
+                return True
+            time.sleep(0.01)
+        return False